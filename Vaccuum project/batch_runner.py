@@ -0,0 +1,118 @@
+"""
+Solve many seeded vacuum worlds in a pool of worker processes.
+
+    from batch_runner import WorldSpec, run_batch
+    from vacuum_heuristics import MSTToyHeuristic
+
+    specs = [WorldSpec('toy', 10, 10, .1, None, seed) for seed in range(1000)]
+    for record in run_batch(specs, heuristic=MSTToyHeuristic):
+        print(record)
+
+Only the specs and the result records cross between processes: each worker
+builds its worlds from the specs itself, runs a planning agent in them until
+they are clean, and sends back a RunRecord. A worker solves many worlds, so
+its module-level caches (grid topologies, distance fields and jump tables
+are shared by every world with the same layout) stay warm from one to the
+next.
+"""
+
+import contextlib
+import functools
+import io
+import random
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from environments import Agent
+from search import InstrumentedProblem, astar_search
+from vacuum_grid import VacuumGrid
+from vacuum_toy_grid import ToyVacuumGrid
+from vacuum_planning_agent_program import VacuumPlanningAgentProgram
+from vacuum_toy_planning_program import ToyVacuumPlanningAgentProgram
+
+
+@dataclass(frozen=True)
+class WorldSpec:
+    """A world to build: kind is 'toy' for a ToyVacuumGrid or 'dirt' for a
+    VacuumGrid (which ignores toy_chance and max_toys), and random is seeded
+    with seed just before building it."""
+    kind: str
+    width: int
+    height: int
+    toy_chance: float = .2
+    max_toys: int = None
+    seed: int = 0
+
+    def build(self):
+        random.seed(self.seed)
+        if self.kind == 'toy':
+            return ToyVacuumGrid(self.width, self.height, self.toy_chance, self.max_toys)
+        return VacuumGrid(self.width, self.height)
+
+
+@dataclass(frozen=True)
+class RunRecord:
+    """What happened in one world: whether the agent cleaned it, how many
+    actions it took, how many nodes its searches expanded, the seconds it
+    took, and the peak bytes allocated meanwhile (None if not traced)."""
+    spec: WorldSpec
+    solved: bool
+    plan: int
+    expanded: int
+    seconds: float
+    peak_bytes: int
+
+
+def solve_world(spec, searcher=astar_search, heuristic=None, compact=True, max_steps=10000, trace_memory=False):
+    """Build the world of spec, run a planning agent in it until it is done,
+    the agent gives up or max_steps actions, and return a RunRecord.
+    searcher, heuristic and compact are passed to the agent program."""
+    problems = []
+
+    def counted(problem, h):
+        problems.append(InstrumentedProblem(problem))
+        return searcher(problems[-1], h)
+
+    program_class = ToyVacuumPlanningAgentProgram if spec.kind == 'toy' else VacuumPlanningAgentProgram
+    program = program_class(compact=compact, heuristic=heuristic, searcher=counted)
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        env = spec.build()
+        env.add_thing(Agent(program))
+        env.headless_mode()
+        env.run_until_done(max_steps)
+    seconds = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return RunRecord(spec, env.is_done(), program.steps, sum(problem.succs for problem in problems), seconds, peak)
+
+
+def run_batch(specs, searcher=astar_search, heuristic=None, compact=True, max_steps=10000, trace_memory=False,
+              workers=None, chunksize=1):
+    """Solve every spec with solve_world in a pool of workers processes (one
+    per core by default) and yield their RunRecords in the order of specs,
+    each as soon as it and the ones before it are done. searcher and
+    heuristic must pickle, so use module-level functions and classes or
+    functools.partial of them, not lambdas."""
+    solve = functools.partial(solve_world, searcher=searcher, heuristic=heuristic, compact=compact,
+                              max_steps=max_steps, trace_memory=trace_memory)
+    with ProcessPoolExecutor(workers) as pool:
+        yield from pool.map(solve, specs, chunksize=chunksize)
+
+
+if __name__ == '__main__':
+    from vacuum_heuristics import MSTToyHeuristic
+
+    start = time.perf_counter()
+    records = list(run_batch([WorldSpec('toy', 10, 10, .1, None, seed) for seed in range(200)],
+                             heuristic=MSTToyHeuristic, trace_memory=True))
+    solved = [record for record in records if record.solved]
+    print(f'{len(solved)} of {len(records)} worlds solved in {time.perf_counter() - start:.1f}s, '
+          f'{sum(record.expanded for record in records)} nodes expanded, '
+          f'peak {max(record.peak_bytes for record in records) / 2 ** 20:.1f} MB')
@@ -0,0 +1,83 @@
+"""
+Worlds and helpers shared by benchmarks.py and benchmark_suite.py.
+"""
+
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+from environments import Agent
+from search import InstrumentedProblem, astar_search
+from vacuum_grid import VacuumGrid
+from vacuum_toy_grid import ToyVacuumGrid
+
+
+def toy_world_state(width, height, toy_chance=.2, max_toys=None, seed=0):
+    """Build a seeded ToyVacuumGrid with one agent in it and return the
+    percept the agent would see on its first step."""
+    random.seed(seed)
+    env = ToyVacuumGrid(width, height, toy_chance, max_toys)
+    agent = Agent(lambda percept: None)
+    env.add_thing(agent)
+    return env.percept(agent)
+
+
+def dirt_world_state(width, height, seed=0):
+    """Build a seeded VacuumGrid with one agent in it and return the percept
+    the agent would see on its first step."""
+    random.seed(seed)
+    env = VacuumGrid(width, height)
+    agent = Agent(lambda percept: None)
+    env.add_thing(agent)
+    return env.percept(agent)
+
+
+class ExpansionBudgetExceeded(Exception):
+    """Raised by BudgetedProblem once a search has used up its expansions."""
+
+
+class BudgetedProblem(InstrumentedProblem):
+    """An InstrumentedProblem that stops the search after max_expansions
+    expansions, so large instances measure throughput instead of running
+    until they are out of memory."""
+
+    def __init__(self, problem, max_expansions):
+        super().__init__(problem)
+        self.max_expansions = max_expansions
+
+    def actions(self, state):
+        if self.succs >= self.max_expansions:
+            raise ExpansionBudgetExceeded
+        return super().actions(state)
+
+
+def quiet(fn, *args, **kwargs):
+    """Call fn with stdout discarded (the problems print their initial state)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def timed_astar(problem, h, searcher=astar_search):
+    """Run astar_search (or searcher) on a BudgetedProblem and return
+    (expansions, seconds, plan length), with '-' for the plan if the budget
+    ran out and None if there is no plan."""
+    start = time.perf_counter()
+    try:
+        node = searcher(problem, h)
+        plan = node and len(node.solution())
+    except ExpansionBudgetExceeded:
+        plan = '-'
+    return problem.succs, time.perf_counter() - start, plan
+
+
+def weighted(h, weight):
+    """Return h scaled by weight, for weighted A*."""
+    return lambda node: weight * h(node)
+
+
+def silence():
+    """Discard the output of a pool process (the planners print their plans)."""
+    sys.stdout = open(os.devnull, 'w')
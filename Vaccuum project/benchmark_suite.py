@@ -0,0 +1,177 @@
+"""
+A benchmark suite for the searchers in search.py, for tracking them from one
+version of the code to the next. Run from this directory with e.g.
+
+    python benchmark_suite.py --families dirt eight_puzzle --searchers astar ida* \
+        --repeats 3 --json results.json --csv results.csv
+
+Every searcher runs on every problem family at every size, repeats times
+with seeds seed, seed + 1, ..., and each run becomes one row: the counts
+InstrumentedProblem keeps (as compare_searchers prints them), the cost and
+length of the plan, the seconds it took by time.perf_counter, and the peak
+bytes allocated meanwhile by tracemalloc. Memory is measured in a second
+run of its own, since tracing slows the search down. A searcher is cut off
+after max_expansions expansions, and once it is cut off on every repeat of
+one size it is not tried on the larger ones: that size is its scaling cliff.
+"""
+
+import argparse
+import csv
+import functools
+import json
+import platform
+import random
+import time
+import tracemalloc
+
+from benchmark_fixtures import BudgetedProblem, ExpansionBudgetExceeded, dirt_world_state, toy_world_state, quiet
+from search import (EightPuzzle, NQueensProblem, GraphProblem, RandomGraph, astar_search, uniform_cost_search,
+                    breadth_first_graph_search, depth_first_graph_search, iterative_deepening_search,
+                    recursive_best_first_search, ida_star_search, sma_star_search)
+from vacuum_planning_agent_program import CompactVacuumGridProblem
+from vacuum_toy_planning_program import CompactToyVacuumGridProblem
+from vacuum_heuristics import MSTDirtHeuristic, MSTToyHeuristic
+
+
+def dirt_problem(size, seed):
+    problem = quiet(CompactVacuumGridProblem, dirt_world_state(size, size, seed))
+    return problem, MSTDirtHeuristic(problem)
+
+
+def toy_problem(size, seed):
+    problem = quiet(CompactToyVacuumGridProblem, toy_world_state(size, size, seed=seed))
+    return problem, MSTToyHeuristic(problem)
+
+
+def eight_puzzle_problem(size, seed):
+    """An EightPuzzle scrambled by size random moves from the goal, so it is
+    always solvable and size bounds the length of the solution."""
+    random.seed(seed)
+    problem = EightPuzzle((1, 2, 3, 4, 5, 6, 7, 8, 0))
+    state = problem.goal
+    for _ in range(size):
+        state = problem.result(state, random.choice(problem.actions(state)))
+    problem = EightPuzzle(state)
+    return problem, problem.h
+
+
+def nqueens_problem(size, seed):
+    problem = NQueensProblem(size)
+    return problem, problem.h
+
+
+def graph_problem(size, seed):
+    """A route between two random cities of a RandomGraph of size cities,
+    spread out so their density stays the same as size grows."""
+    random.seed(seed)
+    graph = RandomGraph(list(range(size)), 3, int(40 * size ** .5), int(30 * size ** .5))
+    problem = GraphProblem(*random.sample(range(size), 2), graph)
+    return problem, problem.h
+
+
+# Each family builds a (problem, h) pair from a size and a seed, and is run
+# at the sizes listed by default.
+FAMILIES = {
+    'dirt': (dirt_problem, (7, 9, 10, 11, 12)),
+    'toy': (toy_problem, (7, 9, 10, 11, 12)),
+    'eight_puzzle': (eight_puzzle_problem, (5, 10, 20, 40, 80)),
+    'nqueens': (nqueens_problem, (4, 6, 8, 10, 12)),
+    'graph': (graph_problem, (100, 1000, 5000)),
+}
+
+# Each searcher is called as searcher(problem, h) and returns a goal node.
+SEARCHERS = {
+    'astar': astar_search,
+    'uniform_cost': lambda problem, h: uniform_cost_search(problem),
+    'breadth_first': lambda problem, h: breadth_first_graph_search(problem),
+    'depth_first': lambda problem, h: depth_first_graph_search(problem),
+    'iterative_deepening': lambda problem, h: iterative_deepening_search(problem),
+    'rbfs': recursive_best_first_search,
+    'ida*': functools.partial(ida_star_search, transpositions=100000),
+    'sma*': functools.partial(sma_star_search, max_bytes=50 * 2 ** 20),
+}
+
+
+def run_once(family, size, seed, searcher, max_expansions, memory):
+    """Build the problem and search it once. Return a row of results, or
+    just the peak bytes if memory."""
+    problem, h = FAMILIES[family][0](size, seed)
+    problem = BudgetedProblem(problem, max_expansions)
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    node, status = None, 'solved'
+    try:
+        node = SEARCHERS[searcher](problem, h)
+        if node is None:
+            status = 'no solution'
+    except ExpansionBudgetExceeded:
+        status = 'cut off'
+    except RecursionError:
+        status = 'too deep'
+    seconds = time.perf_counter() - start
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+    return {'family': family, 'size': size, 'seed': seed, 'searcher': searcher, 'status': status,
+            'cost': node.path_cost if node else None, 'length': len(node.solution()) if node else None,
+            'expanded': problem.succs, 'goal_tests': problem.goal_tests, 'states': problem.states,
+            'seconds': seconds}
+
+
+def run_suite(families=tuple(FAMILIES), searchers=tuple(SEARCHERS), sizes=None, repeats=3, seed=0,
+              max_expansions=100000, memory=True, display=True):
+    """Run every searcher on every family and return the list of rows. sizes,
+    if given, replaces the default sizes of every family."""
+    rows = []
+    for family in families:
+        for searcher in searchers:
+            for size in sizes or FAMILIES[family][1]:
+                cut_off = 0
+                for repeat in range(repeats):
+                    row = run_once(family, size, seed + repeat, searcher, max_expansions, False)
+                    row['peak_bytes'] = run_once(family, size, seed + repeat, searcher, max_expansions,
+                                                 True) if memory else None
+                    rows.append(row)
+                    cut_off += row['status'] == 'cut off'
+                    if display:
+                        print('{family:>12} {size:>6} {seed:>4} {searcher:>20} {status:>12} {length!s:>6} '
+                              '{expanded:>8} {seconds:>8.3f} {peak_bytes!s:>10}'.format(**row))
+                if cut_off == repeats:
+                    break
+    return rows
+
+
+def write_json(rows, path):
+    """Write rows to path as JSON, with the Python version and the time."""
+    with open(path, 'w') as file:
+        json.dump({'python': platform.python_version(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'rows': rows}, file, indent=1)
+
+
+def write_csv(rows, path):
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the searchers of search.py.')
+    parser.add_argument('--families', nargs='+', choices=list(FAMILIES), default=list(FAMILIES))
+    parser.add_argument('--searchers', nargs='+', choices=list(SEARCHERS), default=list(SEARCHERS))
+    parser.add_argument('--sizes', nargs='+', type=int)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-expansions', type=int, default=100000)
+    parser.add_argument('--no-memory', action='store_true', help="don't measure peak memory")
+    parser.add_argument('--json', help='write the results to this JSON file')
+    parser.add_argument('--csv', help='write the results to this CSV file')
+    args = parser.parse_args()
+    results = run_suite(args.families, args.searchers, args.sizes, args.repeats, args.seed, args.max_expansions,
+                        not args.no_memory)
+    if args.json:
+        write_json(results, args.json)
+    if args.csv:
+        write_csv(results, args.csv)
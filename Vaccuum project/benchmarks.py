@@ -0,0 +1,558 @@
+"""
+Benchmarks for the search code used by the vacuum planners.
+
+Run from this directory with the names of the benchmarks to run, e.g.
+
+    python benchmarks.py capacity macro
+
+or with --all to run all of them, which takes a long while; --list lists
+them. Every benchmark builds its worlds from a fixed random seed, so two runs on
+different versions of the code search exactly the same problems.
+"""
+
+import argparse
+import contextlib
+import functools
+import io
+import math
+import multiprocessing
+import random
+import time
+import tracemalloc
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from benchmark_fixtures import (BudgetedProblem, dirt_world_state, toy_world_state, quiet, timed_astar, weighted,
+                                silence)
+from environments import Agent
+from search import (InstrumentedProblem, astar_search, breadth_first_graph_search, bidirectional_search, GraphProblem,
+                    RandomGraph, ida_star_search, sma_star_search, ara_star_solutions, portfolio_search)
+from vacuum_grid import VacuumGrid
+from vacuum_toy_grid import ToyVacuumGrid
+from vacuum_planning_agent_program import CompactVacuumGridProblem, DirtTourPlanner, VacuumPlanningAgentProgram
+from vacuum_toy_planning_program import (ToyVacuumGridProblem, CompactToyVacuumGridProblem, ZobristToyVacuumGridProblem,
+                                         PrunedToyVacuumGridProblem, MacroToyVacuumGridProblem,
+                                         ToyVacuumPlanningAgentProgram, get_heuristic, get_compact_heuristic)
+from vacuum_heuristics import MSTDirtHeuristic, MSTToyHeuristic, CapacityToyHeuristic, distance_fields
+from grid_context import GridContext
+from jump_point import JumpPointSearch
+from disk_explored import DiskExploredSet
+
+
+def benchmark_toy_astar(sizes=(10, 15, 20, 25, 30, 35, 40), toy_chance=.2, seed=0, max_expansions=50000,
+                        compact=False):
+    """Time astar_search on square toy grids and print how many nodes it
+    expands per second. Searches that hit max_expansions are cut off and
+    reported without a plan. If compact, search CompactToyVacuumGridProblem.
+    Returns a list of (size, expansions, seconds) rows."""
+    problem_class, heuristic = ((CompactToyVacuumGridProblem, get_compact_heuristic) if compact
+                                else (ToyVacuumGridProblem, get_heuristic))
+    rows = []
+    print('{:>6} {:>12} {:>10} {:>14} {:>8}'.format('size', 'expansions', 'seconds', 'expansions/s', 'plan'))
+    for size in sizes:
+        state = toy_world_state(size, size, toy_chance, seed=seed)
+        problem = BudgetedProblem(quiet(problem_class, state), max_expansions)
+        start = time.perf_counter()
+        try:
+            plan = len(astar_search(problem, lambda n: heuristic(n.state, problem.grid)).solution())
+        except ExpansionBudgetExceeded:
+            plan = '-'
+        elapsed = time.perf_counter() - start
+        rows.append((size, problem.succs, elapsed))
+        print('{:>6} {:>12} {:>10.2f} {:>14.0f} {:>8}'.format(size, problem.succs, elapsed,
+                                                          problem.succs / elapsed, plan))
+    return rows
+
+
+def successor_states(problem, count):
+    """Return count states made by expanding problem.initial breadth first,
+    the way a search fills its frontier and explored set."""
+    states, frontier = [], deque([problem.initial])
+    while len(states) < count:
+        state = frontier.popleft()
+        for action in problem.actions(state):
+            child = problem.result(state, action)
+            states.append(child)
+            frontier.append(child)
+    return states[:count]
+
+
+def benchmark_state_encoding(size=60, toy_chance=.4, count=100000, seed=0):
+    """Compare ToySearchState with CompactToyVacuumState: bytes allocated per
+    successor state and the time to hash every state once."""
+    state = toy_world_state(size, size, toy_chance, seed=seed)
+    print('{:>10} {:>14} {:>14}'.format('encoding', 'bytes/state', 'hash ns/state'))
+    for label, problem_class in (('tuples', ToyVacuumGridProblem), ('compact', CompactToyVacuumGridProblem)):
+        problem = quiet(problem_class, state)
+        tracemalloc.start()
+        states = successor_states(problem, count)
+        size_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        start = time.perf_counter()
+        for s in states:
+            hash(s)
+        elapsed = time.perf_counter() - start
+        print('{:>10} {:>14.0f} {:>14.0f}'.format(label, size_bytes / count, elapsed / count * 1e9))
+
+
+def benchmark_world_construction(sizes=(25, 50, 100, 200), toy_chance=.2, steps=1000, seed=0):
+    """Time building square ToyVacuumGrids and then executing steps random
+    moves in them, each followed by the percept and is_done check the next
+    step makes. That is what Environment.run spends its time on outside the
+    agent program. Last, time deleting every thing but the agent in random
+    order, one at a time as picking up toys or sucking dirt does."""
+    print('{:>6} {:>10} {:>12} {:>14} {:>14} {:>14}'.format('size', 'things', 'build s', 'step us', 'percept us',
+                                                            'delete us'))
+    for size in sizes:
+        random.seed(seed)
+        start = time.perf_counter()
+        env = ToyVacuumGrid(size, size, toy_chance)
+        built = time.perf_counter() - start
+        agent = Agent(lambda percept: None)
+        env.add_thing(agent)
+        actions = [random.choice(['Left', 'Right', 'Up', 'Down', 'PickUp']) for _ in range(steps)]
+        start = time.perf_counter()
+        for action in actions:
+            env.execute_action(agent, action)
+        stepped = time.perf_counter() - start
+        start = time.perf_counter()
+        for action in actions:
+            env.execute_action(agent, action)
+            env.percept(agent)
+            env.is_done()
+        perceived = time.perf_counter() - start - stepped
+        things = [thing for thing in env.things if thing is not agent]
+        random.shuffle(things)
+        start = time.perf_counter()
+        for thing in things:
+            env.delete_thing(thing)
+        deleted = time.perf_counter() - start
+        print('{:>6} {:>10} {:>12.3f} {:>14.1f} {:>14.1f} {:>14.1f}'.format(
+            size, len(things) + 1, built, stepped / steps * 1e6, perceived / steps * 1e6, deleted / len(things) * 1e6))
+
+
+def benchmark_heuristics(sizes=(7, 9, 10, 11, 12), toy_chance=.2, seed=0, max_expansions=200000):
+    """Compare the original heuristics of the two planners with the MST
+    heuristics from vacuum_heuristics, on seeded dirt and toy worlds. The
+    MST heuristics are admissible, so their plans are optimal."""
+    print('{:>6} {:>6} {:>8} | {:>10} {:>8} {:>6} | {:>10} {:>8} {:>6}'.format(
+        'world', 'size', 'targets', 'expanded', 'seconds', 'plan', 'mst exp', 'seconds', 'plan'))
+    for world in ('dirt', 'toy'):
+        for size in sizes:
+            if world == 'dirt':
+                state = dirt_world_state(size, size, seed)
+                problem_class, targets = CompactVacuumGridProblem, len(state.dirts)
+                original, mst = (lambda p: lambda n: 10 * n.state.dirts.bit_count()), MSTDirtHeuristic
+            else:
+                state = toy_world_state(size, size, toy_chance, seed=seed)
+                problem_class, targets = CompactToyVacuumGridProblem, len(state.toys)
+                original, mst = (lambda p: lambda n: get_compact_heuristic(n.state, p.grid)), MSTToyHeuristic
+            row = [world, size, targets]
+            for heuristic in (original, mst):
+                problem = BudgetedProblem(quiet(problem_class, state), max_expansions)
+                row.extend(timed_astar(problem, heuristic(problem)))
+            print('{:>6} {:>6} {:>8} | {:>10} {:>8.2f} {:>6} | {:>10} {:>8.2f} {:>6}'.format(*row))
+
+
+def benchmark_capacity(sizes=(10, 13, 16), max_toys=10, toy_chance=.2, seed=0, max_expansions=200000):
+    """Compare toy heuristics on worlds where max_toys forces trips to the
+    box: the original get_compact_heuristic, the MST bound, and the
+    capacity-aware bound, the last also weighted by 2 (f = g + 2h), which
+    returns plans at most twice the optimal length."""
+    heuristics = (('original', lambda p: lambda n: get_compact_heuristic(n.state, p.grid)),
+                  ('mst', MSTToyHeuristic),
+                  ('capacity', CapacityToyHeuristic),
+                  ('capacity w=2', lambda p: weighted(CapacityToyHeuristic(p), 2)))
+    print('{:>6} {:>6} {:>14} {:>10} {:>8} {:>6}'.format('size', 'toys', 'heuristic', 'expanded', 'seconds', 'plan'))
+    for size in sizes:
+        state = toy_world_state(size, size, toy_chance, max_toys, seed)
+        for label, heuristic in heuristics:
+            problem = BudgetedProblem(quiet(CompactToyVacuumGridProblem, state), max_expansions)
+            print('{:>6} {:>6} {:>14} {:>10} {:>8.2f} {:>6}'.format(size, len(state.toys), label,
+                                                                    *timed_astar(problem, heuristic(problem))))
+
+
+def benchmark_bidirectional(sizes=(1000, 5000, 10000), min_links=3, pairs=5, seed=0):
+    """Time bidirectional_search against astar_search on GraphProblems over
+    RandomGraphs, laid out so the density of cities stays the same as the
+    graphs grow. Both should find the same path costs."""
+    print('{:>8} {:>10} {:>10} {:>10} {:>6}'.format('nodes', 'build s', 'mm s', 'astar s', 'agree'))
+    for size in sizes:
+        random.seed(seed)
+        start = time.perf_counter()
+        graph = RandomGraph(list(range(size)), min_links, int(40 * size ** .5), int(30 * size ** .5))
+        built = time.perf_counter() - start
+        problems = [GraphProblem(a, b, graph) for a, b in (random.sample(range(size), 2) for _ in range(pairs))]
+        start = time.perf_counter()
+        costs = [bidirectional_search(problem) for problem in problems]
+        mm = time.perf_counter() - start
+        start = time.perf_counter()
+        astar_costs = [astar_search(problem).path_cost for problem in problems]
+        astar = time.perf_counter() - start
+        print('{:>8} {:>10.2f} {:>10.3f} {:>10.3f} {:>6}'.format(size, built, mm, astar, str(costs == astar_costs)))
+
+
+# The searchers benchmark_memory compares, by name so they can be sent to a
+# fresh process.
+MEMORY_SEARCHERS = {
+    'astar': astar_search,
+    'ida*': functools.partial(ida_star_search, transpositions=100000),
+    'sma* 50MB': functools.partial(sma_star_search, max_bytes=50 * 2 ** 20),
+}
+
+
+def peak_rss_search(searcher, size, toy_chance, seed, max_expansions):
+    """Solve a seeded toy world with MEMORY_SEARCHERS[searcher] and return
+    (MB before searching, peak MB, expansions, seconds, plan). Meant to run
+    in a process of its own, since the peak RSS of a process never goes
+    down. Needs the resource module, so Unix only."""
+    import resource
+    state = toy_world_state(size, size, toy_chance, seed=seed)
+    problem = BudgetedProblem(quiet(CompactToyVacuumGridProblem, state), max_expansions)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    row = timed_astar(problem, MSTToyHeuristic(problem), MEMORY_SEARCHERS[searcher])
+    return (before, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024) + row
+
+
+def benchmark_memory(sizes=(9, 10, 12, 13), toy_chance=.2, seed=0, max_expansions=300000):
+    """Report the peak resident memory of each of MEMORY_SEARCHERS against
+    the size of the toy grid, every search in a new process."""
+    print('{:>6} {:>10} {:>10} {:>10} {:>10} {:>8} {:>6}'.format('size', 'searcher', 'base MB', 'peak MB', 'expanded',
+                                                                  'seconds', 'plan'))
+    context = multiprocessing.get_context('spawn')
+    for size in sizes:
+        for searcher in MEMORY_SEARCHERS:
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                row = pool.submit(peak_rss_search, searcher, size, toy_chance, seed, max_expansions).result()
+            print('{:>6} {:>10} {:>10.1f} {:>10.1f} {:>10} {:>8.2f} {:>6}'.format(size, searcher, *row))
+
+
+def benchmark_anytime(size=13, max_toys=10, toy_chance=.2, seed=0, time_budget=20, initial_weight=3):
+    """Print each plan ara_star_solutions finds within time_budget seconds on
+    a seeded toy world, with when it was found and its suboptimality bound."""
+    state = toy_world_state(size, size, toy_chance, max_toys, seed)
+    problem = InstrumentedProblem(quiet(CompactToyVacuumGridProblem, state))
+    print('{:>8} {:>10} {:>6} {:>6}'.format('seconds', 'expanded', 'plan', 'bound'))
+    start = time.perf_counter()
+    for node, bound in ara_star_solutions(problem, CapacityToyHeuristic(problem), initial_weight,
+                                          deadline=start + time_budget):
+        print('{:>8.3f} {:>10} {:>6} {:>6.3f}'.format(time.perf_counter() - start, problem.succs,
+                                                      len(node.solution()), bound))
+
+
+def bfs_distance(topology, start, goal):
+    """Breadth first search from start, stopping at goal. Return the number
+    of moves between them and the number of cells expanded."""
+    seen, frontier, expanded = {start: 0}, deque([start]), 0
+    while frontier:
+        cell = frontier.popleft()
+        if cell == goal:
+            return seen[cell], expanded
+        expanded += 1
+        for _, neighbour in topology.moves[cell]:
+            if neighbour not in seen:
+                seen[neighbour] = seen[cell] + 1
+                frontier.append(neighbour)
+    return float('inf'), expanded
+
+
+def benchmark_jump_points(sizes=(50, 100, 200, 400), queries=20, seed=0):
+    """Compare JumpPointSearch with breadth first search between random
+    pairs of free cells of seeded square toy rooms with no toys: cells
+    expanded and time per query, and whether the distances agree. The jump
+    tables JumpPointSearch builds once per grid are timed on their own."""
+    print('{:>6} {:>12} {:>10} {:>12} {:>10} {:>10} {:>6}'.format('size', 'bfs expanded', 'bfs ms', 'jps expanded',
+                                                                  'jps ms', 'tables ms', 'agree'))
+    for size in sizes:
+        grid = GridContext.from_state(toy_world_state(size, size, 0, seed=seed))
+        topology = grid.topology
+        free = [cell for cell in range(topology.size) if topology.free[cell]]
+        random.seed(seed)
+        pairs = [random.sample(free, 2) for _ in range(queries)]
+        start = time.perf_counter()
+        bfs = [bfs_distance(topology, a, b) for a, b in pairs]
+        bfs_time = time.perf_counter() - start
+        search = JumpPointSearch(topology)
+        start = time.perf_counter()
+        search.build_tables()
+        tables = time.perf_counter() - start
+        jps, expanded = [], 0
+        start = time.perf_counter()
+        for a, b in pairs:
+            jps.append(len(search.path(a, b)) - 1)
+            expanded += search.expanded
+        jps_time = time.perf_counter() - start
+        print('{:>6} {:>12.0f} {:>10.2f} {:>12.0f} {:>10.3f} {:>10.0f} {:>6}'.format(
+            size, sum(e for _, e in bfs) / queries, bfs_time / queries * 1e3, expanded / queries,
+            jps_time / queries * 1e3, tables * 1e3, str(jps == [d for d, _ in bfs])))
+
+
+def benchmark_portfolio(sizes=(9, 10, 12), toy_chance=.2, seed=0, max_expansions=300000, timeout=60):
+    """Time each of a few optimal toy planners alone, then portfolio_search
+    racing all of them, on seeded toy worlds. The portfolio should take
+    about as long as the fastest planner, plus the cost of starting the
+    processes."""
+    print('{:>6} {:>12} {:>10} {:>8} {:>6}'.format('size', 'searcher', 'expanded', 'seconds', 'plan'))
+    for size in sizes:
+        state = toy_world_state(size, size, toy_chance, seed=seed)
+        problem = quiet(CompactToyVacuumGridProblem, state)
+        h = MSTToyHeuristic(problem)
+        searchers = {'astar': lambda p: astar_search(p, h),
+                     'ida*': lambda p: ida_star_search(p, h, 100000),
+                     'sma* 50MB': lambda p: sma_star_search(p, h, max_bytes=50 * 2 ** 20)}
+        for label, searcher in searchers.items():
+            row = timed_astar(BudgetedProblem(problem, max_expansions), None, lambda p, _: searcher(p))
+            print('{:>6} {:>12} {:>10} {:>8.2f} {:>6}'.format(size, label, *row))
+        start = time.perf_counter()
+        node = portfolio_search(problem, searchers, timeout)
+        print('{:>6} {:>12} {:>10} {:>8.2f} {:>6}'.format(size, 'portfolio', node.strategy if node else '-',
+                                                        time.perf_counter() - start, node and len(node.solution())))
+
+
+def benchmark_zobrist(sizes=(9, 10, 12), toy_chance=.2, seed=0, max_expansions=300000):
+    """Run A* with MSTToyHeuristic on the tuple, compact and Zobrist toy
+    problems, and IDA* with a transposition table on the last two, on
+    seeded toy worlds. All of them expand the same nodes."""
+    print('{:>6} {:>10} {:>8} {:>10} {:>8} {:>6}'.format('size', 'problem', 'search', 'expanded', 'seconds', 'plan'))
+    for size in sizes:
+        state = toy_world_state(size, size, toy_chance, seed=seed)
+        for label, problem_class in (('tuples', ToyVacuumGridProblem), ('compact', CompactToyVacuumGridProblem),
+                                     ('zobrist', ZobristToyVacuumGridProblem)):
+            problem = quiet(problem_class, state)
+            h = MSTToyHeuristic(problem)
+            searchers = {'astar': astar_search}
+            if label != 'tuples':
+                searchers['ida*'] = functools.partial(ida_star_search, transpositions=100000)
+            for search_label, searcher in searchers.items():
+                row = timed_astar(BudgetedProblem(problem, max_expansions), h, searcher)
+                print('{:>6} {:>10} {:>8} {:>10} {:>8.2f} {:>6}'.format(size, label, search_label, *row))
+
+
+def benchmark_disk_explored(size=9, toy_chance=.2, seed=0, max_states=(None, 20000)):
+    """Run breadth_first_graph_search on a seeded Zobrist toy world with the
+    explored set in memory (None) and in a DiskExploredSet holding each of
+    max_states states in memory, and report the peak Python memory."""
+    state = toy_world_state(size, size, toy_chance, seed=seed)
+    problem = quiet(ZobristToyVacuumGridProblem, state)
+    print('{:>10} {:>10} {:>6} {:>8} {:>8} {:>10}'.format('in memory', 'explored', 'runs', 'probes', 'seconds',
+                                                          'peak MB'))
+    for cap in max_states:
+        explored = DiskExploredSet(cap) if cap else set()
+        tracemalloc.start()
+        start = time.perf_counter()
+        breadth_first_graph_search(problem, explored=explored)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        runs, probes = (len(explored.runs), explored.probes) if cap else ('-', '-')
+        print('{:>10} {:>10} {:>6} {:>8} {:>8.2f} {:>10.1f}'.format(cap or 'all', len(explored), runs, probes, elapsed,
+                                                                   peak / 2 ** 20))
+        if cap:
+            explored.close()
+
+
+def benchmark_bucket_queue(sizes=(10, 12, 13), toy_chance=.2, seed=0, max_expansions=300000):
+    """Run A* with the MST heuristics on seeded dirt and toy worlds with a
+    PriorityQueue frontier and with a BucketQueue frontier, which
+    best_first_graph_search picks when problem.integer_costs is set."""
+    print('{:>6} {:>6} | {:>10} {:>8} {:>6} | {:>10} {:>8} {:>6}'.format(
+        'world', 'size', 'heap exp', 'seconds', 'plan', 'bucket exp', 'seconds', 'plan'))
+    for world in ('dirt', 'toy'):
+        for size in sizes:
+            if world == 'dirt':
+                problem = quiet(CompactVacuumGridProblem, dirt_world_state(size, size, seed))
+                h = MSTDirtHeuristic(problem)
+            else:
+                problem = quiet(CompactToyVacuumGridProblem, toy_world_state(size, size, toy_chance, seed=seed))
+                h = MSTToyHeuristic(problem)
+            row = [world, size]
+            for integer_costs in (False, True):
+                problem.integer_costs = integer_costs
+                row.extend(timed_astar(BudgetedProblem(problem, max_expansions), h))
+            print('{:>6} {:>6} | {:>10} {:>8.2f} {:>6} | {:>10} {:>8.2f} {:>6}'.format(*row))
+
+
+def benchmark_pruning(sizes=(9, 10, 12), max_toys=(None, 3), toy_chance=.2, seed=0, max_expansions=300000):
+    """Run A* with CapacityToyHeuristic on CompactToyVacuumGridProblem and on
+    PrunedToyVacuumGridProblem, on seeded toy worlds with the default (all
+    the toys) and a small capacity."""
+    print('{:>6} {:>8} | {:>10} {:>8} {:>6} | {:>10} {:>8} {:>6}'.format(
+        'size', 'capacity', 'expanded', 'seconds', 'plan', 'pruned', 'seconds', 'plan'))
+    for capacity in max_toys:
+        for size in sizes:
+            state = toy_world_state(size, size, toy_chance, capacity, seed=seed)
+            row = [size, state.max_toys]
+            for problem_class in (CompactToyVacuumGridProblem, PrunedToyVacuumGridProblem):
+                problem = quiet(problem_class, state)
+                row.extend(timed_astar(BudgetedProblem(problem, max_expansions), CapacityToyHeuristic(problem)))
+            print('{:>6} {:>8} | {:>10} {:>8.2f} {!s:>6} | {:>10} {:>8.2f} {!s:>6}'.format(*row))
+
+
+def benchmark_macro(worlds=((10, .2, None), (10, .2, 3), (20, .03, None), (50, .004, None), (50, .006, 4)), seed=0,
+                    max_expansions=300000):
+    """Run A* with CapacityToyHeuristic on CompactToyVacuumGridProblem and on
+    its MacroToyVacuumGridProblem, on seeded (size, toy_chance, max_toys) toy
+    worlds. The macro plan is expanded back into primitive steps, so both
+    plan columns count primitive actions."""
+    print('{:>6} {:>5} {:>8} | {:>10} {:>8} {:>6} | {:>10} {:>8} {:>6}'.format(
+        'size', 'toys', 'capacity', 'expanded', 'seconds', 'plan', 'macro', 'seconds', 'plan'))
+    for size, toy_chance, max_toys in worlds:
+        state = toy_world_state(size, size, toy_chance, max_toys, seed=seed)
+        problem = quiet(CompactToyVacuumGridProblem, state)
+        row = [size, len(state.toys), state.max_toys]
+        row.extend(timed_astar(BudgetedProblem(problem, max_expansions), CapacityToyHeuristic(problem)))
+        macro = MacroToyVacuumGridProblem(problem)
+        row.extend(timed_astar(BudgetedProblem(macro, max_expansions), CapacityToyHeuristic(macro),
+                               lambda problem, h: macro.primitive_plan(astar_search(problem, h))))
+        print('{:>6} {:>5} {:>8} | {:>10} {:>8.2f} {!s:>6} | {:>10} {:>8.2f} {!s:>6}'.format(*row))
+
+
+def benchmark_tour(sizes=(5, 7, 9, 11, 13, 25, 50, 100), time_limits=(0, 1, None), seed=0, max_expansions=300000,
+                   astar_max_size=13):
+    """Plan the cleanup of seeded dirt worlds with A* and MSTDirtHeuristic
+    (up to astar_max_size) and with DirtTourPlanner at each time limit, and
+    print the seconds and plan length of each. The distance fields are
+    cleared before every tour so each one pays for its own distance matrix."""
+    print('{:>6} {:>6} | {:>10} {:>8} {:>6}'.format('size', 'dirts', 'expanded', 'seconds', 'plan') +
+          ''.join(' | {:>8} {:>6}'.format('limit ' + str(limit), 'plan') for limit in time_limits))
+    for size in sizes:
+        problem = quiet(CompactVacuumGridProblem, dirt_world_state(size, size, seed))
+        row = [size, problem.initial.dirts.bit_count()]
+        if size <= astar_max_size:
+            row.extend(timed_astar(BudgetedProblem(problem, max_expansions), MSTDirtHeuristic(problem)))
+        else:
+            row.extend(('-', math.nan, '-'))
+        for limit in time_limits:
+            distance_fields(problem.grid).fields.clear()
+            start = time.perf_counter()
+            node = DirtTourPlanner(problem, limit).plan()
+            row.extend((time.perf_counter() - start, node and len(node.solution())))
+        print('{:>6} {:>6} | {:>10} {:>8.2f} {!s:>6}'.format(*row[:5]) +
+              ''.join(' | {:>8.2f} {!s:>6}'.format(*row[i:i + 2]) for i in range(5, len(row), 2)))
+
+
+MULTI_AGENT_WORLDS = {
+    'dirt': (lambda: VacuumGrid(30, 30), lambda: VacuumPlanningAgentProgram(compact=True, tour=True)),
+    'toy': (lambda: ToyVacuumGrid(30, 30, .01, 3),
+            lambda: ToyVacuumPlanningAgentProgram(heuristic=CapacityToyHeuristic, macro=True)),
+}
+
+
+def benchmark_multi_agent(worlds=('dirt', 'toy'), agents=(1, 2, 4), executors=(None, 'thread', 'process'), seed=0,
+                          max_steps=3000):
+    """Run 1, 2 and 4 planning agents together on seeded MULTI_AGENT_WORLDS,
+    with their programs run one after another, on a thread pool and on a
+    process pool, and print the steps and seconds until the world is done."""
+    print('{:>6} {:>7} {:>8} | {:>6} {:>6} {:>8}'.format('world', 'agents', 'pool', 'done', 'steps', 'seconds'))
+    for world in worlds:
+        make_env, make_program = MULTI_AGENT_WORLDS[world]
+        for count in agents:
+            for executor in executors:
+                random.seed(seed)
+                env = make_env()
+                for _ in range(count):
+                    env.add_thing(Agent(make_program()))
+                if executor == 'thread':
+                    env.executor = ThreadPoolExecutor(count)
+                elif executor == 'process':
+                    env.executor = ProcessPoolExecutor(count, initializer=silence)
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for step in range(max_steps):
+                        if env.is_done():
+                            break
+                        for agent, action in zip(env.agents, env.deliberate()):
+                            env.execute_action(agent, action)
+                seconds = time.perf_counter() - start
+                if env.executor:
+                    env.executor.shutdown()
+                print('{:>6} {:>7} {!s:>8} | {!s:>6} {:>6} {:>8.2f}'.format(world, count, executor, env.is_done(), step,
+                                                                           seconds))
+
+
+HEADLESS_WORLDS = {
+    'dirt': (lambda size: VacuumGrid(size, size), lambda: VacuumPlanningAgentProgram(compact=True, tour=True)),
+    'toy': (lambda size: ToyVacuumGrid(size, size, .004, 4),
+            lambda: ToyVacuumPlanningAgentProgram(heuristic=CapacityToyHeuristic, macro=True)),
+}
+
+
+def benchmark_headless(worlds=(('dirt', 51), ('dirt', 101), ('toy', 51)), seed=0, max_steps=100000):
+    """Run a planning agent in seeded HEADLESS_WORLDS until they are done:
+    with a percept for every step, as a loop calling the program would, with
+    run in headless mode, and with run_until_done in headless mode, which
+    replays plans without percepts. The first step, which makes the plan,
+    is taken before the clock starts, so the seconds printed are those of
+    carrying the plan out."""
+    print('{:>6} {:>6} | {:>6} | {:>10} {:>10} {:>14}'.format('world', 'size', 'steps', 'percepts', 'run',
+                                                              'run_until_done'))
+    for world, size in worlds:
+        make_env, make_program = HEADLESS_WORLDS[world]
+        row = [world, size]
+        for mode in ('percepts', 'run', 'run_until_done'):
+            random.seed(seed)
+            env = make_env(size)
+            program = make_program()
+            agent = Agent(program)
+            env.add_thing(agent)
+            env.headless_mode()
+            with contextlib.redirect_stdout(io.StringIO()):
+                env.execute_action(agent, program(env.percept(agent)))
+                start = time.perf_counter()
+                if mode == 'percepts':
+                    for _ in range(max_steps):
+                        if env.is_done():
+                            break
+                        action = program(env.percept(agent))
+                        if action is None:
+                            break
+                        env.execute_action(agent, action)
+                elif mode == 'run':
+                    env.run(max_steps)
+                else:
+                    env.run_until_done(max_steps)
+            row.append(time.perf_counter() - start)
+        print('{:>6} {:>6} | {:>6} | {:>10.3f} {:>10.3f} {:>14.3f}'.format(*row[:2], program.steps, *row[2:]))
+
+
+# The benchmarks by the name they are run by, each called with its defaults.
+BENCHMARKS = {
+    'toy_astar': benchmark_toy_astar,
+    'toy_astar_compact': functools.partial(benchmark_toy_astar, compact=True),
+    'state_encoding': benchmark_state_encoding,
+    'world_construction': benchmark_world_construction,
+    'heuristics': benchmark_heuristics,
+    'capacity': benchmark_capacity,
+    'bidirectional': benchmark_bidirectional,
+    'memory': benchmark_memory,
+    'anytime': benchmark_anytime,
+    'jump_points': benchmark_jump_points,
+    'portfolio': benchmark_portfolio,
+    'zobrist': benchmark_zobrist,
+    'disk_explored': benchmark_disk_explored,
+    'bucket_queue': benchmark_bucket_queue,
+    'pruning': benchmark_pruning,
+    'macro': benchmark_macro,
+    'tour': benchmark_tour,
+    'multi_agent': benchmark_multi_agent,
+    'headless': benchmark_headless,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the vacuum planners.')
+    parser.add_argument('benchmarks', nargs='*', metavar='benchmark', help='the benchmarks to run, by name; see --list')
+    parser.add_argument('--all', action='store_true', help='run every benchmark')
+    parser.add_argument('--list', action='store_true', help='list the benchmarks and exit')
+    args = parser.parse_args()
+    if args.list:
+        print('\n'.join(BENCHMARKS))
+    elif not (args.all or args.benchmarks):
+        parser.error('name the benchmarks to run, or pass --all')
+    elif set(args.benchmarks) - set(BENCHMARKS):
+        unknown = sorted(set(args.benchmarks) - set(BENCHMARKS))
+        parser.error('unknown benchmarks: {} (see --list)'.format(' '.join(unknown)))
+    else:
+        for name in BENCHMARKS if args.all else args.benchmarks:
+            print(name)
+            BENCHMARKS[name]()
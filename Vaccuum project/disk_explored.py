@@ -0,0 +1,193 @@
+"""
+An explored set that spills to disk, for searches whose closed list does
+not fit in memory.
+
+    from disk_explored import DiskExploredSet
+
+    with DiskExploredSet(max_states=10 ** 6) as explored:
+        node = astar_search(problem, h, explored=explored)
+
+The first max_states states are kept in an ordinary set. When it is full
+they are pickled, sorted by a 64-bit digest of their pickle and written
+out as a run: an index file of fixed size (digest, offset, length) records
+and a data file of the pickles. A lookup that misses the set then binary
+searches the memory-mapped index of every run. A bloom filter over every
+state written to disk answers most of those lookups without touching the
+runs at all, and once there are more than max_runs runs they are merged
+into one, so a lookup never probes more than a few files.
+
+States are compared by their pickles, so equal states must pickle to the
+same bytes; the compact and Zobrist vacuum states do. The files go to a
+temporary directory under directory (the system default if None), which is
+removed by close().
+"""
+
+import hashlib
+import heapq
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+
+RECORD = struct.Struct('<QQI')  # digest, offset into the data file, length
+
+
+def digest(data):
+    """A 64-bit digest of data, the same in every process."""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+class BloomFilter:
+    """A bloom filter of bits bits over 64-bit digests, probed at hashes
+    positions made from the two halves of the digest."""
+
+    def __init__(self, bits=2 ** 27, hashes=4):
+        self.bits = bits
+        self.hashes = hashes
+        self.array = bytearray((bits + 7) // 8)
+
+    def positions(self, key):
+        low, high = key & 0xffffffff, key >> 32
+        return [(low + i * high) % self.bits for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.array[position >> 3] >> (position & 7) & 1 for position in self.positions(key))
+
+
+class Run:
+    """One sorted run of pickled states on disk."""
+
+    def __init__(self, path, records):
+        """Write records, (digest, pickle) pairs sorted by digest, to the
+        files path.idx and path.dat and map them."""
+        self.path = path
+        with open(path + '.idx', 'wb') as index, open(path + '.dat', 'wb') as data:
+            offset = 0
+            for key, blob in records:
+                index.write(RECORD.pack(key, offset, len(blob)))
+                data.write(blob)
+                offset += len(blob)
+        self.size = os.path.getsize(path + '.idx') // RECORD.size
+        self.index = self.map(path + '.idx')
+        self.data = self.map(path + '.dat')
+
+    @staticmethod
+    def map(path):
+        with open(path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return b''
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def record(self, i):
+        key, offset, length = RECORD.unpack_from(self.index, i * RECORD.size)
+        return key, self.data[offset:offset + length]
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self.record(i)
+
+    def __contains__(self, item):
+        """item is a (digest, pickle) pair."""
+        key, blob = item
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if RECORD.unpack_from(self.index, mid * RECORD.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        while lo < self.size:
+            found, data = self.record(lo)
+            if found != key:
+                return False
+            if data == blob:
+                return True
+            lo += 1
+        return False
+
+    def close(self):
+        for mapped in (self.index, self.data):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+        os.remove(self.path + '.idx')
+        os.remove(self.path + '.dat')
+
+
+class DiskExploredSet:
+    """A set of states, for the explored argument of best_first_graph_search,
+    astar_search, uniform_cost_search and breadth_first_graph_search, that
+    keeps at most max_states of them in memory and the rest on disk."""
+
+    def __init__(self, max_states=10 ** 6, max_runs=8, bloom_bits=2 ** 27, directory=None):
+        self.max_states = max_states
+        self.max_runs = max_runs
+        self.memory = set()
+        self.runs = []
+        self.bloom = BloomFilter(bloom_bits)
+        self.on_disk = 0
+        self.probes = 0  # lookups that had to search the runs
+        self.directory = tempfile.TemporaryDirectory(prefix='explored-', dir=directory)
+        self.run_count = 0
+
+    def __len__(self):
+        return len(self.memory) + self.on_disk
+
+    def add(self, state):
+        self.memory.add(state)
+        if len(self.memory) >= self.max_states:
+            self.spill()
+
+    def __contains__(self, state):
+        if state in self.memory:
+            return True
+        if not self.runs:
+            return False
+        blob = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+        key = digest(blob)
+        if key not in self.bloom:
+            return False
+        self.probes += 1
+        return any((key, blob) in run for run in self.runs)
+
+    def spill(self):
+        """Write the states in memory out as a new run."""
+        records = []
+        for state in self.memory:
+            blob = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+            key = digest(blob)
+            self.bloom.add(key)
+            records.append((key, blob))
+        records.sort()
+        self.runs.append(self.new_run(records))
+        self.on_disk += len(records)
+        self.memory = set()
+        if len(self.runs) > self.max_runs:
+            self.merge()
+
+    def merge(self):
+        """Merge every run into one."""
+        runs, self.runs = self.runs, []
+        self.runs.append(self.new_run(heapq.merge(*runs)))
+        for run in runs:
+            run.close()
+
+    def new_run(self, records):
+        self.run_count += 1
+        return Run(os.path.join(self.directory.name, 'run{}'.format(self.run_count)), records)
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+        self.runs = []
+        self.directory.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
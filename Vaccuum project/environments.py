@@ -1,6 +1,10 @@
 import numbers
 import collections
+import itertools
+import bisect
+import os
 import random
+from time import sleep
 from utils4e import distance_squared, turn_heading
 
 
@@ -68,14 +72,27 @@ class Environment:
         percept:           Define the percept that an agent sees.
         execute_action:    Define the effects of executing an action.
                            Also update the agent.performance slot.
-    The environment keeps a list of .things and .agents (which is a subset
-    of .things). Each agent has a .performance slot, initialized to 0.
+    The environment keeps the .things in it, in the order they were added
+    (a dict, so they can be deleted in constant time), and a list of
+    .agents (which is a subset of .things). Each agent has a .performance slot, initialized to 0.
     Each thing has a .location slot, even though some environments may not
-    need this."""
+    need this.
+    Things are also indexed by location and by class, so point queries and
+    things_of/locations_of don't scan .things. Once a thing is added, change its location through
+    relocate (or XYEnvironment.move_to) rather than by assigning .location,
+    or the index goes stale."""
 
     def __init__(self):
-        self.things = []
+        self.things = {}  # thing -> None, in the order things were added
         self.agents = []
+        self.location_index = {}  # location -> things there, in the order they were added
+        self.class_index = {}  # Thing subclass -> {thing: None} for each instance of it
+        self.location_cache = {}  # Thing subclass -> tuple of the locations of its instances
+        self.add_order = {}  # thing -> its position in the order things were added
+        self.add_counter = itertools.count()
+        self.executor = None  # a concurrent.futures executor the agent programs deliberate on, if set
+        self.render_every = 1  # display every render_every-th step, never if 0 or None
+        self.headless = False  # if True, displaying never pauses or clears the screen
 
     def thing_classes(self):
         return []  # List of classes that can go into environment
@@ -104,18 +121,33 @@ class Environment:
         """Run the environment for one time step. If the
         actions and exogenous changes are independent, this method will
         do. If there are interactions between them, you'll need to
-        override this method."""
+        override this method. Return the actions taken."""
         if not self.is_done():
-            actions = []
-            for agent in self.agents:
-                if agent.alive:
-                    actions.append(agent.program(self.percept(agent)))
-                else:
-                    actions.append("")
+            actions = self.deliberate()
             for (agent, action) in zip(self.agents, actions):
                 self.execute_action(agent, action)
             self.exogenous_change()
-            self.display(s, actions)
+            self.render(s, actions)
+            return actions
+
+    def deliberate(self):
+        """Return the action of every agent for this step ("" for the dead),
+        from percepts all taken before any program runs. If self.executor is
+        set the programs run on it concurrently. A process pool runs a copy
+        of each program, and the copy that comes back, holding whatever the
+        program remembered, replaces the agent's program."""
+        live = [agent for agent in self.agents if agent.alive]
+        percepts = [self.percept(agent) for agent in live]
+        if self.executor is None:
+            chosen = [agent.program(percept) for agent, percept in zip(live, percepts)]
+        else:
+            chosen = []
+            for agent, (program, action) in zip(live, self.executor.map(run_program, [agent.program for agent in live],
+                                                                        percepts)):
+                agent.program = program
+                chosen.append(action)
+        chosen = iter(chosen)
+        return [next(chosen) if agent.alive else "" for agent in self.agents]
 
     def run(self, steps=1000):
         """Run the Environment for given number of time steps."""
@@ -124,18 +156,66 @@ class Environment:
                 return
             self.step(step)
 
+    def run_until_done(self, max_steps=1000):
+        """Run the Environment until it is done, for at most max_steps steps,
+        and return the number of steps taken. It also stops when every agent
+        program returns None, giving up. While the only agent's program has
+        a plan left to replay (see SimpleProblemSolvingAgentProgram.replay)
+        its actions are taken without building percepts for it; with other
+        agents about, a plan can't be trusted without checking."""
+        for step in range(max_steps):
+            if self.is_done():
+                return step
+            replay = getattr(self.agents[0].program, 'replay', None) if len(self.agents) == 1 else None
+            action = replay() if replay and self.agents[0].alive else None
+            if action is not None:
+                actions = [action]
+                self.execute_action(self.agents[0], action)
+                self.exogenous_change()
+                self.render(step, actions)
+            elif all(action is None for action in self.step(step)):
+                return step + 1
+        return max_steps
+
+    def render(self, s, actions):
+        """Display step s, if it is one in every render_every."""
+        if self.render_every and s % self.render_every == 0:
+            self.display(s, actions)
+
+    def headless_mode(self, render_every=None):
+        """Display only every render_every-th step (none if None), without the
+        pauses and screen clearing an environment may display with, so
+        that long runs go as fast as the agents can."""
+        self.headless = True
+        self.render_every = render_every
+
+    def things_of(self, tclass):
+        """Return a live view of the things that are instances of tclass
+        (or a subclass), in the order they were added."""
+        return self.class_index.setdefault(tclass, {}).keys()
+
+    def locations_of(self, tclass):
+        """Return a tuple of the locations of the things that are instances of
+        tclass, in the order they were added. The tuple is cached until a
+        thing of that class is added, deleted or relocated."""
+        try:
+            return self.location_cache[tclass]
+        except KeyError:
+            locations = self.location_cache[tclass] = tuple([thing.location for thing in self.things_of(tclass)])
+            return locations
+
     def list_things_at(self, location, tclass=Thing):
-        """Return all things exactly at a given location."""
-        if isinstance(location, numbers.Number):
-            return [thing for thing in self.things
-                    if thing.location == location and isinstance(thing, tclass)]
-        return [thing for thing in self.things
-                if all(x == y for x, y in zip(thing.location, location)) and isinstance(thing, tclass)]
+        """Return all things exactly at a given location. tclass may be a
+        class or a tuple of classes, as for isinstance."""
+        if isinstance(tclass, type) and not self.class_index.get(tclass):
+            return []
+        return [thing for thing in self.location_index.get(location_key(location), ())
+                if isinstance(thing, tclass)]
 
     def some_things_at(self, location, tclass=Thing):
         """Return true if at least one of the things at location
         is an instance of class tclass (or a subclass)."""
-        return self.list_things_at(location, tclass) != []
+        return any(isinstance(thing, tclass) for thing in self.location_index.get(location_key(location), ()))
 
     def add_thing(self, thing, location=None):
         """Add a thing to the environment, setting its location. For
@@ -143,31 +223,73 @@ class Environment:
         for it. (Shouldn't need to override this.)"""
         if not isinstance(thing, Thing):
             thing = Agent(thing)
-        if thing in self.things:
+        if thing in self.add_order:
             print("Can't add the same thing twice")
         else:
             thing.location = location if location is not None else self.default_location(thing)
-            self.things.append(thing)
+            self.things[thing] = None
+            self.add_order[thing] = next(self.add_counter)
+            self.location_index.setdefault(location_key(thing.location), []).append(thing)
+            for tclass in type(thing).__mro__[:-1]:
+                self.class_index.setdefault(tclass, {})[thing] = None
+                self.location_cache.pop(tclass, None)
             if isinstance(thing, Agent):
                 thing.performance = 0
                 self.agents.append(thing)
 
     def delete_thing(self, thing):
         """Remove a thing from the environment."""
-        try:
-            self.things.remove(thing)
-        except ValueError as e:
-            print(e)
+        if thing not in self.things:
+            print("Can't delete a thing that isn't in the environment")
             print("  in Environment delete_thing")
             print("  Thing to be removed: {} at {}".format(thing, thing.location))
             print("  from list: {}".format([(thing, thing.location) for thing in self.things]))
+        else:
+            del self.things[thing]
+            self.unindex_location(thing)
+            for tclass in type(thing).__mro__[:-1]:
+                del self.class_index[tclass][thing]
+                self.location_cache.pop(tclass, None)
+            del self.add_order[thing]
         if thing in self.agents:
             self.agents.remove(thing)
 
+    def relocate(self, thing, location):
+        """Move thing to location, keeping the location index up to date."""
+        self.unindex_location(thing)
+        thing.location = location
+        for tclass in type(thing).__mro__[:-1]:
+            self.location_cache.pop(tclass, None)
+        # keep each location's things in the order they were added, as a scan of .things would
+        bisect.insort(self.location_index.setdefault(location_key(location), []), thing,
+                      key=self.add_order.__getitem__)
+
+    def unindex_location(self, thing):
+        """Remove thing from the location index entry for its current location."""
+        key = location_key(thing.location)
+        here = self.location_index[key]
+        here.remove(thing)
+        if not here:
+            del self.location_index[key]
+
     def display(self, s, action):
         pass
 
 
+def location_key(location):
+    """Return the key a location is indexed under. Sequence locations are
+    compared element-wise, so [x, y] and (x, y) find the same things."""
+    if location is None or isinstance(location, numbers.Number):
+        return location
+    return tuple(location)
+
+
+def run_program(program, percept):
+    """Return program and the action it chooses for percept. Environment.deliberate runs this on
+    its executor, so that a program run in another process comes back with its new state."""
+    return program, program(percept)
+
+
 class Direction:
     """A direction class for agents that want to move in a 2D plane
         Usage:
@@ -300,8 +422,9 @@ class XYEnvironment(Environment):
 
     def default_location(self, thing):
         location = self.random_location_inbounds()
-        while self.some_things_at(location, Obstacle):
-            # we will find a random location with no obstacles
+        avoid = (Obstacle, Agent) if isinstance(thing, Agent) else Obstacle
+        while self.some_things_at(location, avoid):
+            # we will find a random location with no obstacles (and, for an agent, no other agent)
             location = self.random_location_inbounds()
         return location
 
@@ -310,7 +433,7 @@ class XYEnvironment(Environment):
         If thing is holding anything, they move with him."""
         thing.bump = self.some_things_at(destination, Obstacle)
         if not thing.bump:
-            thing.location = destination
+            self.relocate(thing, destination)
             for o in self.observers:
                 o.thing_moved(thing)
             for t in thing.holding:
@@ -439,6 +562,42 @@ class VacuumEnvironment(XYEnvironment):
             agent.performance -= 1
 
 
+class VacuumGridEnvironment(XYEnvironment):
+    """The base of VacuumGrid and ToyVacuumGrid: a walled grid its agents see
+    whole and move about a cell at a time. Agents are in each other's way,
+    except on a cell with a thing of one of the shared classes (the toy box,
+    which they all need to reach), and their moves are made in the order
+    they were added. A percept gives the cells of the agents in the way as
+    others, apart from the obstacles, so the grid a program plans on stays
+    the same while they move about."""
+
+    shared = ()  # classes of things on whose cells agents aren't in each other's way
+    moves = {'Left': (-1, 0), 'Right': (1, 0), 'Up': (0, -1), 'Down': (0, 1)}
+
+    def agents_in_way(self, agent):
+        """Return a tuple of the locations of the other agents in agent's way."""
+        return tuple([other.location for other in self.agents
+                      if other is not agent and not self.some_things_at(other.location, self.shared)])
+
+    def move(self, agent, action):
+        """Move agent a cell by one of the moves, unless a wall, an obstacle or
+        an agent is in the way."""
+        dx, dy = self.moves[action]
+        new_loc = (agent.location[0] + dx, agent.location[1] + dy)
+        if not (self.some_things_at(new_loc, (Obstacle, Wall)) or
+                self.some_things_at(new_loc, Agent) and not self.some_things_at(new_loc, self.shared)):
+            self.relocate(agent, new_loc)
+
+    def display(self, s, action):
+        if not self.headless:
+            sleep(0.5)
+            os.system('clear')
+        print(f'step {s}: action {action}')
+        # draw the world as it is now, not as the program last perceived it, which it
+        # doesn't when run_until_done replays its plan
+        self.percept(self.agents[0]).display()
+
+
 loc_A, loc_B = (0, 0), (1, 0)  # The two locations for the Vacuum world
 
 
@@ -464,10 +623,10 @@ class TrivialVacuumEnvironment(Environment):
         """Change agent's location and/or location's status; track performance.
         Score 10 for each dirt cleaned; -1 for each move."""
         if action == 'Right':
-            agent.location = loc_B
+            self.relocate(agent, loc_B)
             agent.performance -= 1
         elif action == 'Left':
-            agent.location = loc_A
+            self.relocate(agent, loc_A)
             agent.performance -= 1
         elif action == 'Suck':
             if self.status[agent.location] == 'Dirty':
@@ -0,0 +1,99 @@
+"""
+The static half of a vacuum world.
+
+A percept (VGState or ToyVacuumState) describes the whole world, but during
+a search only the agent, the dirt or toys left, and what the agent carries
+ever change. A search problem builds one GridContext from its initial
+percept and shares it between all nodes, and the search states only hold
+the fields that change.
+"""
+
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+
+from grid_encoding import border_mask, cells_to_mask, cell_location, mask_cells
+
+# Search problems on a grid use small ints for actions. ACTION_NAMES maps
+# them back to the strings the environments understand.
+LEFT, RIGHT, UP, DOWN, SUCK, PICK_UP, DROP = range(7)
+MOVES = (LEFT, RIGHT, UP, DOWN)
+ACTION_NAMES = ('Left', 'Right', 'Up', 'Down', 'Suck', 'PickUp', 'Drop')
+
+
+@dataclass(frozen=True)
+class GridContext:
+    """Everything about a grid that stays fixed while searching it.
+    obstacles is a frozenset of (x, y) locations and blocked is the bitmask
+    (see grid_encoding) of every cell the agent can't enter: the walls
+    around the edge plus the obstacles. box and max_toys are only set for
+    toy worlds."""
+    width: int
+    height: int
+    obstacles: frozenset
+    blocked: int
+    box: tuple = None
+    max_toys: int = None
+
+    @classmethod
+    def from_state(cls, state):
+        """Build the context of a VGState or ToyVacuumState percept."""
+        return cls(width=state.width, height=state.height,
+                   obstacles=frozenset(state.obstacles),
+                   blocked=cells_to_mask(state.obstacles, state.width) | border_mask(state.width, state.height),
+                   box=getattr(state, 'box', None),
+                   max_toys=getattr(state, 'max_toys', None))
+
+    def is_inbounds(self, loc):
+        """Check if loc is inside the walls"""
+        x, y = loc
+        return 0 < x < self.width - 1 and 0 < y < self.height - 1
+
+    @cached_property
+    def topology(self):
+        """The GridTopology of this grid, shared with every grid with the same
+        walls and obstacles (see grid_topology)."""
+        return grid_topology(self.width, self.height, self.blocked)
+
+
+@lru_cache(maxsize=64)
+def grid_topology(width, height, blocked):
+    """Return the GridTopology of a layout. Worlds of one size often share
+    their layout and only differ in dirt, toys and box, so a process that
+    plans in many of them builds each layout's tables once, and everything
+    cached on a topology (distance fields, jump tables) stays warm."""
+    return GridTopology(width, height, blocked)
+
+
+class GridTopology:
+    """The cells of a grid and the moves between them, precomputed as tables
+    indexed by cell index (see grid_encoding), so a search expands a node
+    with a few list lookups instead of building and testing neighbours.
+        free[i]       True if the agent can stand on cell i
+        step[a][i]    the cell move a leads to from cell i (i if blocked)
+        moves[i]      the (move, neighbour) pairs that leave cell i
+        legal[i]      just the moves of moves[i]
+        locations[i]  the (x, y) location of cell i"""
+
+    def __init__(self, width, height, blocked):
+        size = width * height
+        offsets = (-1, 1, -width, width)  # indexed by LEFT, RIGHT, UP, DOWN
+        blocked = format(blocked, '0{}b'.format(size))[::-1]
+        self.width, self.height = width, height
+        self.size = size
+        self.free = [blocked[i] == '0' for i in range(size)]
+        self.step = [[i + offset if 0 <= i + offset < size and self.free[i + offset] else i
+                      for i in range(size)]
+                     for offset in offsets]
+        self.moves = [tuple((move, self.step[move][i]) for move in MOVES if self.step[move][i] != i)
+                      for i in range(size)]
+        self.legal = [tuple(move for move, _ in moves) for moves in self.moves]
+        self.locations = [cell_location(i, width) for i in range(size)]
+
+    def around(self, cells):
+        """Return the set of cells a move away from the cells of bitmask cells."""
+        return {neighbour for cell in mask_cells(cells) for _, neighbour in self.moves[cell]}
+
+    def legal_avoiding(self, cell, occupied):
+        """Return the moves of legal[cell] that don't lead onto a cell of
+        bitmask occupied."""
+        return tuple([move for move in self.legal[cell] if not occupied >> self.step[move][cell] & 1])
@@ -0,0 +1,94 @@
+"""
+Helpers for packing grid locations into ints.
+
+A cell (x, y) on a grid of the given width is numbered y * width + x, and a
+set of cells is an int with bit i set for every cell i in the set. Adding,
+removing and testing a single cell are then one bitwise operation, and a
+whole set hashes and compares like a single number.
+"""
+
+import random
+from functools import lru_cache
+
+
+def cell_index(loc, width):
+    """Return the index of the cell at loc = (x, y)."""
+    x, y = loc
+    return y * width + x
+
+
+def cell_location(index, width):
+    """Return the (x, y) location of the cell with the given index."""
+    y, x = divmod(index, width)
+    return x, y
+
+
+def cells_to_mask(cells, width):
+    """Pack an iterable of (x, y) locations into a bitmask."""
+    mask = 0
+    for loc in cells:
+        mask |= 1 << cell_index(loc, width)
+    return mask
+
+
+def mask_to_cells(mask, width):
+    """Unpack a bitmask into a tuple of (x, y) locations, in index order."""
+    cells = []
+    while mask:
+        low = mask & -mask
+        cells.append(cell_location(low.bit_length() - 1, width))
+        mask ^= low
+    return tuple(cells)
+
+
+def mask_cells(mask):
+    """Return the indices of the bits set in mask."""
+    cells = []
+    while mask:
+        low = mask & -mask
+        cells.append(low.bit_length() - 1)
+        mask ^= low
+    return cells
+
+
+def border_mask(width, height):
+    """Return the mask of the cells on the outer edge of the grid, where
+    add_walls puts the walls."""
+    mask = 0
+    for x in range(width):
+        mask |= 1 << cell_index((x, 0), width)
+        mask |= 1 << cell_index((x, height - 1), width)
+    for y in range(height):
+        mask |= 1 << cell_index((0, y), width)
+        mask |= 1 << cell_index((width - 1, y), width)
+    return mask
+
+
+class ZobristKeys:
+    """[Zobrist 1970] A random 64-bit key for every feature a grid search
+    state can have: the agent on cell i, an item (dirt or toy) on cell i,
+    and the agent carrying n toys. The hash of a state is the XOR of the
+    keys of its features, so a move, a pickup or a suck updates it with an
+    XOR or two instead of hashing the whole state again."""
+
+    def __init__(self, size, seed=0):
+        rng = random.Random(seed)
+        self.agent = [rng.getrandbits(64) for _ in range(size)]
+        self.item = [rng.getrandbits(64) for _ in range(size)]
+        self.carried = [rng.getrandbits(64) for _ in range(size + 1)]
+
+    def mask_key(self, mask):
+        """XOR of the item keys of the cells in mask."""
+        key = 0
+        while mask:
+            low = mask & -mask
+            key ^= self.item[low.bit_length() - 1]
+            mask ^= low
+        return key
+
+
+@lru_cache(maxsize=16)
+def zobrist_keys(size):
+    """The ZobristKeys of grids with size cells. They are seeded, so states
+    of one grid hash the same in every process."""
+    return ZobristKeys(size)
@@ -0,0 +1,104 @@
+"""
+What the vacuum planning programs share: planning on the grid of a percept
+while other agents move about on it.
+"""
+
+import random
+
+from search import SimpleProblemSolvingAgentProgram
+from grid_context import MOVES, ACTION_NAMES
+from grid_encoding import cell_index, cells_to_mask
+
+
+class GridPlanningAgentProgram(SimpleProblemSolvingAgentProgram):
+    """The base of VacuumPlanningAgentProgram and ToyVacuumPlanningAgentProgram.
+    A percept gives the other agents in the way apart from the obstacles
+    (see environments.VacuumGridEnvironment), so plans are made on a grid
+    that stays the same while they move, and the topology and distance
+    fields cached for it stay warm from one plan to the next. At every
+    percept their cells are blocked in the problem's actions (see
+    VacuumGridProblem.block), and a plan whose next move is onto one of them
+    is repaired around it. Of two agents in each other's way, the one on the
+    higher cell waits a step first, or both could step aside the same way
+    and meet again. If there is no way around, the agent waits for the way
+    to clear; after patience waits in a row it steps aside to a free cell
+    instead and plans again, as the agent in its way may be waiting for it
+    in turn. An agent with nothing left to do steps away from the agents
+    next to it, which may still have work that it is in the way of."""
+
+    def __init__(self, patience=3):
+        super().__init__()
+        self.patience = patience
+        self.occupied = 0  # the bitmask of the cells of the other agents in the way
+        self.blocker = None  # the cell of the agent the plan's next move is blocked by
+        self.waits = 0
+        self.waited_at = None  # the step at which the agent waited last
+
+    def __call__(self, percept):
+        action = super().__call__(percept)
+        topology, cell = self.problem.topology, self.cell()
+        if action is None and len(topology.legal_avoiding(cell, self.occupied)) < len(topology.legal[cell]):
+            return self.step_aside()
+        return action
+
+    def update_state(self, percept):
+        # Replace our stored state with the new one. We are assuming that the percept
+        # is a full description of the environment
+        self.state = percept
+        self.occupied = cells_to_mask(percept.others, percept.width)
+        self.blocker = None
+        if self.problem:
+            self.problem.block(self.occupied)
+
+    def set_plan(self, plan):
+        super().set_plan(plan)
+        if self.problem:
+            # a new problem is searched without the other agents, who have moved on by the time
+            # most of its plan is carried out, and only blocks them from now on
+            self.problem.block(self.occupied)
+
+    def plan_blocked(self):
+        move = ACTION_NAMES.index(self.seq[0])
+        if move in MOVES:
+            target = self.problem.topology.step[move][self.cell()]
+            if self.occupied >> target & 1:
+                self.blocker = target
+        return self.blocker is not None
+
+    def repair(self, state):
+        if self.blocker is not None and self.blocker < self.cell() and self.waited_at != self.steps:
+            return False
+        return super().repair(state)
+
+    def wait(self):
+        if self.waited_at != self.steps:
+            self.waited_at, self.waits = self.steps, 0
+        self.waits += 1
+        if self.waits <= self.patience:
+            return 'NoOp'
+        self.waits = 0
+        self.set_plan(None)
+        return self.step_aside() or 'NoOp'
+
+    def step_aside(self):
+        """Return the move to a random free cell next to the agent's, if
+        possible one with no other agent next to it, or None if there is no
+        free cell."""
+        topology, occupied = self.problem.topology, self.occupied
+        free = [(move, cell) for move, cell in topology.moves[self.cell()] if not occupied >> cell & 1]
+        clear = [move for move, cell in free if not any(occupied >> other & 1 for _, other in topology.moves[cell])]
+        moves = clear or [move for move, _ in free]
+        return ACTION_NAMES[random.choice(moves)] if moves else None
+
+    def cell(self):
+        """Return the index of the agent's cell."""
+        return cell_index(self.state.agent, self.state.width)
+
+    def search_state(self):
+        return self.problem.state_class.from_state(self.state)
+
+    def to_action(self, action):
+        return ACTION_NAMES[action]
+
+    def show_state(self):
+        self.state.display()
@@ -0,0 +1,175 @@
+"""
+Jump Point Search for shortest paths between two cells of a vacuum grid.
+
+Moves on the grid are 4-connected and all cost 1, so across open floor
+there are many shortest paths that only differ in the order of their moves,
+and A* over single cells expands all of them. Jump Point Search only keeps
+one of them, the canonical path: one that goes straight for as long as it
+can, turning off a horizontal run only where an obstacle beside it ends
+(a forced neighbour). From each node it jumps in a straight line to the
+next cell where a canonical path could turn, a jump point, and A* only
+expands jump points. A vertical run stops wherever a horizontal jump from
+it reaches a jump point, so a path can turn off it anywhere useful.
+
+The search works on cell indices (see grid_encoding) and a GridTopology, so
+it shares the static data of a grid with the search problems.
+"""
+
+import heapq
+import itertools
+
+
+class JumpPointSearch:
+    """Point to point shortest paths on the GridTopology of one layout.
+    expanded is the number of
+    jump points the last call to path expanded.
+
+    Where a run from a cell stops does not depend on the goal, except when
+    it passes the goal, so the first time it is needed every run is found
+    in one sweep over the grid per direction (as in JPS+), and a jump is
+    then a couple of table lookups:
+        jumps[d][i]  the first jump point after cell i in direction d, or None
+        ends[d][i]   the first blocked cell after cell i in direction d
+    where d is 1 or -1 (horizontal) or width or -width (vertical)."""
+
+    def __init__(self, topology):
+        self.width = topology.width
+        self.height = topology.height
+        self.free = topology.free
+        self.expanded = 0
+        self.jumps = self.ends = None
+
+    def build_tables(self):
+        """Fill in jumps and ends. They are only set once complete, as the
+        agents of one environment share the search of their grid and may
+        plan on threads at once."""
+        free, width = self.free, self.width
+        all_jumps, all_ends = {}, {}
+        for step in (1, -1, width, -width):
+            all_jumps[step] = [None] * len(free)
+            all_ends[step] = [None] * len(free)
+        for dx in (1, -1):
+            side = (width, -width)
+            jumps, ends = all_jumps[dx], all_ends[dx]
+            for row in range(1, self.height - 1):
+                first, last = row * width, row * width + width - 1
+                cells = range(last, first - 1, -1) if dx == 1 else range(first, last + 1)
+                point = end = None
+                for cell in cells:
+                    if not free[cell]:
+                        point, end = None, cell
+                        continue
+                    jumps[cell], ends[cell] = point, end
+                    if any(free[cell + s] and not free[cell + s - dx] for s in side):
+                        point = cell
+        for dy in (width, -width):
+            jumps, ends = all_jumps[dy], all_ends[dy]
+            right, left = all_jumps[1], all_jumps[-1]
+            for column in range(1, width - 1):
+                first, last = column, column + (self.height - 1) * width
+                cells = range(last, first - 1, -width) if dy == width else range(first, last + 1, width)
+                point = end = None
+                for cell in cells:
+                    if not free[cell]:
+                        point, end = None, cell
+                        continue
+                    jumps[cell], ends[cell] = point, end
+                    if any(free[cell + s] and not free[cell + s - dy] for s in (1, -1)) or \
+                            right[cell] is not None or left[cell] is not None:
+                        point = cell
+        self.jumps, self.ends = all_jumps, all_ends
+
+    def reaches(self, cell, step, target):
+        """True if target lies after cell in direction step, before the
+        first blocked cell."""
+        end = self.ends[step][cell]
+        return (target - cell) * step > 0 and (end - target) * step > 0
+
+    def jump_horizontal(self, cell, dx, goal):
+        """Run from cell in direction dx (-1 or 1) and return the first jump
+        point reached, or None if the run hits an obstacle first."""
+        point = self.jumps[dx][cell]
+        if goal // self.width == cell // self.width and self.reaches(cell, dx, goal) and \
+                (point is None or (point - goal) * dx >= 0):
+            return goal
+        return point
+
+    def jump_vertical(self, cell, dy, goal):
+        """Run from cell in direction dy (-width or width) and return the
+        first cell a canonical path could turn at, or None: a jump point of
+        its own, or the cell level with the goal if a horizontal run reaches
+        the goal from there."""
+        point = self.jumps[dy][cell]
+        level = cell + (goal // self.width - cell // self.width) * self.width
+        if self.reaches(cell, dy, level) and (point is None or (point - level) * dy > 0):
+            if level == goal or self.reaches(level, 1 if goal > level else -1, goal):
+                return level
+        return point
+
+    def directions(self, cell, parent):
+        """The directions worth leaving cell in, having come from parent."""
+        if parent is None:
+            return 1, -1, self.width, -self.width
+        step = cell - parent
+        if abs(step) < self.width:
+            dx = 1 if step > 0 else -1
+            return dx, self.width, -self.width
+        dy = self.width if step > 0 else -self.width
+        return dy, 1, -1
+
+    def heuristic(self, cell, goal):
+        y, x = divmod(cell, self.width)
+        goal_y, goal_x = divmod(goal, self.width)
+        return abs(x - goal_x) + abs(y - goal_y)
+
+    def path(self, start, goal):
+        """Return the cells of a shortest path from start to goal, both
+        included, or None if there is none."""
+        self.expanded = 0
+        if start == goal:
+            return [start]
+        if self.jumps is None:
+            self.build_tables()
+        width = self.width
+        parents = {start: None}
+        g = {start: 0}
+        counter = itertools.count()
+        frontier = [(self.heuristic(start, goal), next(counter), start)]
+        closed = set()
+        while frontier:
+            _, _, cell = heapq.heappop(frontier)
+            if cell in closed:
+                continue
+            if cell == goal:
+                return self.unfold(parents, goal)
+            closed.add(cell)
+            self.expanded += 1
+            for direction in self.directions(cell, parents[cell]):
+                if not self.free[cell + direction]:
+                    continue
+                if abs(direction) == 1:
+                    point = self.jump_horizontal(cell, direction, goal)
+                else:
+                    point = self.jump_vertical(cell, direction, goal)
+                if point is None or point in closed:
+                    continue
+                cost = g[cell] + abs(point - cell) // (1 if abs(direction) == 1 else width)
+                if cost < g.get(point, cost + 1):
+                    g[point] = cost
+                    parents[point] = cell
+                    heapq.heappush(frontier, (cost + self.heuristic(point, goal), next(counter), point))
+        return None
+
+    def unfold(self, parents, goal):
+        """Fill in the cells between the jump points of a path."""
+        points = []
+        cell = goal
+        while cell is not None:
+            points.append(cell)
+            cell = parents[cell]
+        points.reverse()
+        cells = [points[0]]
+        for a, b in zip(points, points[1:]):
+            step = (1 if b > a else -1) * (1 if abs(b - a) < self.width else self.width)
+            cells.extend(range(a + step, b + step, step))
+        return cells
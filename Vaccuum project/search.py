@@ -6,8 +6,14 @@ then create problem instances and solve them with calls to the various search
 functions.
 """
 
+import heapq
+import itertools
+import multiprocessing
+import numbers
+import queue
 import sys
-from collections import deque
+import time
+from collections import Counter, deque
 
 from utils4e import *
 
@@ -25,6 +31,10 @@ class Problem:
         self.initial = initial
         self.goal = goal
 
+    # Set this to True in a subclass whose path costs are always integers,
+    # to let best_first_graph_search use a BucketQueue.
+    integer_costs = False
+
     def actions(self, state):
         """Return the actions that can be executed in the given
         state. The result would typically be a list, but if there are
@@ -137,30 +147,129 @@ class SimpleProblemSolvingAgentProgram:
     """
     [Figure 3.1]
     Abstract framework for a problem-solving agent.
+
+    If search returns a goal Node rather than a list of actions, the agent
+    also remembers the state the plan expects before each action. Every
+    percept is then checked against that prediction: on track it just takes
+    the next action; if the world is already further along the plan it
+    skips ahead; otherwise it tries to repair the plan with a short breadth
+    first search back to any state still ahead in it, and only formulates
+    and solves a new problem when that fails. When plan_blocked says the
+    next action can't be taken now, e.g. because another agent is in the
+    way, the plan is repaired around it too, and if it can't be, wait gives
+    the action to take meanwhile.
     """
 
-    def __init__(self):
+    def __init__(self, repair_depth=8):
         """State is an abstract representation of the state
         of the world, and seq is the list of actions required
-        to get to a particular state from the initial state(root)."""
+        to get to a particular state from the initial state(root).
+        predicted holds the state expected before each action of seq, and
+        repair_depth bounds the search that mends a plan."""
         self.state = None
         self.goal = None
-        self.seq = []
+        self.problem = None
+        self.seq = deque()
+        self.predicted = deque()
+        self.predicted_index = {}
+        self.steps = 0
+        self.repair_depth = repair_depth
 
     def __call__(self, percept):
         """[Figure 3.1] Formulate a goal and problem, then
         search for a sequence of actions to solve it."""
         self.update_state(percept)
 
+        if self.predicted and not self.follow_plan(self.search_state()):
+            self.set_plan(None)
         if not self.seq:
             self.formulate_goal()
-            problem = self.formulate_problem()
-            self.seq = self.search(problem)
+            problem = self.problem = self.formulate_problem()
+            self.set_plan(self.search(problem))
             print(f"Drop occurs {len([d for d in self.seq if d == 'Drop'])} times")
             print(f'found solution with {len(self.seq)} actions')
             if not self.seq:
                 return None
-        return self.seq.pop(0)
+        if self.plan_blocked() and not self.repair(self.search_state()):
+            return self.wait()
+        self.steps += 1
+        if self.predicted:
+            self.predicted.popleft()
+        return self.seq.popleft()
+
+    def set_plan(self, plan):
+        """Store plan, a goal Node or a list of actions (or None), as the
+        actions to execute and, for a Node, the states they pass through."""
+        self.seq.clear()
+        self.predicted.clear()
+        self.predicted_index.clear()
+        if isinstance(plan, Node):
+            path = plan.path()
+            self.seq.extend(self.to_action(node.action) for node in path[1:])
+            self.predicted.extend(node.state for node in path[:-1])
+            self.index_predicted()
+        elif plan:
+            self.seq.extend(plan)
+
+    def replay(self):
+        """Return the next action of the plan without checking it against a
+        percept, or None if there is no plan left. Only for an environment
+        where nothing but this agent changes the world; see
+        Environment.run_until_done."""
+        if not self.seq:
+            return None
+        self.steps += 1
+        if self.predicted:
+            self.predicted.popleft()
+        return self.seq.popleft()
+
+    def index_predicted(self):
+        """Map every predicted state to the step at which it is expected."""
+        self.predicted_index = {state: self.steps + i for i, state in enumerate(self.predicted)}
+
+    def follow_plan(self, state):
+        """Line the plan up with the observed state. Return False if the plan
+        can't be followed or repaired from it."""
+        if state == self.predicted[0]:
+            return True
+        step = self.predicted_index.get(state)
+        if step is not None and step > self.steps:
+            for _ in range(step - self.steps):
+                self.seq.popleft()
+                self.predicted.popleft()
+            self.steps = step
+            return True
+        return self.repair(state)
+
+    def repair(self, state):
+        """Breadth first search, at most repair_depth actions deep, from state
+        to the nearest state the plan still expects, and splice the path
+        found in front of the rest of the plan. Return True if one was found."""
+        problem = self.problem
+        ahead = self.predicted_index
+        node = Node(state)
+        frontier = deque([node])
+        reached = {state}
+        while frontier:
+            node = frontier.popleft()
+            if node.depth >= self.repair_depth:
+                continue
+            for child in node.expand(problem):
+                if child.state in reached:
+                    continue
+                step = ahead.get(child.state)
+                if step is not None and step >= self.steps:
+                    for _ in range(step - self.steps):
+                        self.seq.popleft()
+                        self.predicted.popleft()
+                    path = child.path()
+                    self.seq.extendleft(self.to_action(n.action) for n in reversed(path[1:]))
+                    self.predicted.extendleft(n.state for n in reversed(path[:-1]))
+                    self.index_predicted()
+                    return True
+                reached.add(child.state)
+                frontier.append(child)
+        return False
 
     def update_state(self, percept):
         """Override to revise our world state model given this percept"""
@@ -179,12 +288,33 @@ class SimpleProblemSolvingAgentProgram:
         Using problem and self.goal. Return the result of the search"""
         raise NotImplementedError
 
+    def plan_blocked(self):
+        """Override to return True when self.state shows that the next action
+        of the plan can't be taken now. self.problem.actions must then leave
+        it out, so that repair finds a way around."""
+        return False
+
+    def wait(self):
+        """Override to return the action to take while the plan is blocked
+        and can't be repaired. By default the agent does nothing."""
+        return 'NoOp'
+
+    def search_state(self):
+        """Override to turn self.state into a state of the problem searched,
+        so it can be compared with the states a plan predicts."""
+        return self.state
+
+    def to_action(self, action):
+        """Override to turn an action of the problem searched into the action
+        the agent program returns."""
+        return action
+
 
 # ______________________________________________________________________________
 # Uninformed Search algorithms
 
 
-def breadth_first_tree_search(problem):
+def breadth_first_tree_search(problem, listener=None):
     """
     [Figure 3.7]
     Search the shallowest nodes in the search tree first.
@@ -198,12 +328,17 @@ def breadth_first_tree_search(problem):
     while frontier:
         node = frontier.popleft()
         if problem.goal_test(node.state):
+            if listener:
+                listener.on_goal(node)
             return node
-        frontier.extend(node.expand(problem))
+        children = node.expand(problem)
+        if listener:
+            listener.expanded(node, children, frontier)
+        frontier.extend(children)
     return None
 
 
-def depth_first_tree_search(problem):
+def depth_first_tree_search(problem, listener=None):
     """
     [Figure 3.7]
     Search the deepest nodes in the search tree first.
@@ -217,12 +352,17 @@ def depth_first_tree_search(problem):
     while frontier:
         node = frontier.pop()
         if problem.goal_test(node.state):
+            if listener:
+                listener.on_goal(node)
             return node
-        frontier.extend(node.expand(problem))
+        children = node.expand(problem)
+        if listener:
+            listener.expanded(node, children, frontier)
+        frontier.extend(children)
     return None
 
 
-def depth_first_graph_search(problem):
+def depth_first_graph_search(problem, listener=None):
     """
     [Figure 3.7]
     Search the deepest nodes in the search tree first.
@@ -237,48 +377,80 @@ def depth_first_graph_search(problem):
     while frontier:
         node = frontier.pop()
         if problem.goal_test(node.state):
+            if listener:
+                listener.on_goal(node)
             return node
         explored.add(node.state)
-        frontier.extend(child for child in node.expand(problem)
-                        if child.state not in explored and child not in frontier)
+        children = node.expand(problem)
+        if listener:
+            listener.expanded(node, children, frontier, explored)
+        for child in children:
+            if child.state not in explored and child not in frontier:
+                frontier.append(child)
+            elif listener:
+                listener.on_duplicate(child)
     return None
 
 
-def breadth_first_graph_search(problem):
+def breadth_first_graph_search(problem, listener=None, explored=None):
     """[Figure 3.11]
     Note that this function can be implemented in a
     single line as below:
     return graph_search(problem, FIFOQueue())
+    explored, if given, is used as the (empty) explored set instead of a
+    set, e.g. a disk_explored.DiskExploredSet.
     """
     node = Node(problem.initial)
     if problem.goal_test(node.state):
+        if listener:
+            listener.on_goal(node)
         return node
     frontier = deque([node])
-    explored = set()
+    in_frontier = {node.state}  # the states in frontier, to test membership in O(1)
+    explored = set() if explored is None else explored
     while frontier:
         node = frontier.popleft()
+        in_frontier.discard(node.state)
         explored.add(node.state)
-        for child in node.expand(problem):
-            if child.state not in explored and child not in frontier:
+        children = node.expand(problem)
+        if listener:
+            listener.expanded(node, children, frontier, explored)
+        for child in children:
+            if child.state not in in_frontier and child.state not in explored:
                 if problem.goal_test(child.state):
+                    if listener:
+                        listener.on_goal(child)
                     return child
                 frontier.append(child)
+                in_frontier.add(child.state)
+            elif listener:
+                listener.on_duplicate(child)
     return None
 
 
-def best_first_graph_search(problem, f, display=False):
+def best_first_graph_search(problem, f, display=False, listener=None, explored=None):
     """Search the nodes with the lowest f scores first.
     You specify the function f(node) that you want to minimize; for example,
     if f is a heuristic estimate to the goal, then we have greedy best
     first search; if f is node.depth then we have breadth-first search.
     There is a subtlety: the line "f = memoize(f, 'f')" means that the f
     values will be cached on the nodes as they are computed. So after doing
-    a best first search you can examine the f values of the path returned."""
+    a best first search you can examine the f values of the path returned.
+    If listener is given, it is told of the search as it goes; see
+    SearchListener. explored, if given, is used as the (empty) explored set
+    instead of a set, e.g. a disk_explored.DiskExploredSet.
+    If the problem says its step costs are integers (integer_costs) and f
+    of the initial node is an int, f is taken to be integer valued and the
+    frontier is a BucketQueue, which pops the nodes of equal f with the
+    largest path cost first; otherwise it is a PriorityQueue."""
     f = memoize(f, 'f')
     node = Node(problem.initial)
-    frontier = PriorityQueue('min', f)
+    if getattr(problem, 'integer_costs', False) and isinstance(f(node), numbers.Integral):
+        frontier = BucketQueue(f, lambda n: n.path_cost)
+    else:
+        frontier = PriorityQueue('min', f)
     frontier.append(node)
-    explored = set()
+    explored = set() if explored is None else explored
     while frontier:
         if display:
             print(f'{len(frontier)} nodes in frontier')
@@ -287,24 +459,32 @@ def best_first_graph_search(problem, f, display=False):
         if problem.goal_test(node.state):
             if display:
                 print(len(explored), "paths have been expanded and", len(frontier), "paths remain in the frontier")
+            if listener:
+                listener.on_goal(node)
             return node
         explored.add(node.state)
+        children = node.expand(problem)
+        if listener:
+            listener.expanded(node, children, frontier, explored)
 
-        for child in node.expand(problem):
+        for child in children:
             if child.state in explored:
-                pass
+                if listener:
+                    listener.on_duplicate(child)
             elif child not in frontier:
                 frontier.append(child)
             elif f(child) < frontier[child]:
                 del frontier[child]
                 frontier.append(child)
+            elif listener:
+                listener.on_duplicate(child)
 
     return None
 
 
-def uniform_cost_search(problem, display=False):
+def uniform_cost_search(problem, display=False, listener=None, explored=None):
     """[Figure 3.14]"""
-    return best_first_graph_search(problem, lambda node: node.path_cost, display)
+    return best_first_graph_search(problem, lambda node: node.path_cost, display, listener, explored)
 
 
 def depth_limited_search(problem, limit=50):
@@ -341,78 +521,96 @@ def iterative_deepening_search(problem):
 # Bidirectional Search
 # Pseudocode from https://webdocs.cs.ualberta.ca/%7Eholte/Publications/MM-AAAI2016.pdf
 
+class MMFrontier:
+    """One direction of bidirectional_search. g maps every state reached to
+    its best known cost and open holds the states not yet expanded. The open
+    states are also kept in three heaps, on priority max(f, 2g) (ties to the
+    smaller g), on f and on g. A heap entry whose state has since been
+    expanded or reached more cheaply is stale and skipped when it comes to
+    the top, so every operation is O(log n) instead of a scan of open."""
+
+    def __init__(self, start, h):
+        self.h = h
+        self.g = {start: 0}
+        self.open = set()
+        self.by_priority, self.by_f, self.by_g = [], [], []
+        self.counter = itertools.count()
+        self.push(start, 0)
+
+    def push(self, state, g):
+        """Open state with cost g."""
+        self.g[state] = g
+        self.open.add(state)
+        f = g + self.h(state)
+        count = next(self.counter)
+        heapq.heappush(self.by_priority, (max(f, 2 * g), g, count, state))
+        heapq.heappush(self.by_f, (f, g, count, state))
+        heapq.heappush(self.by_g, (g, g, count, state))
+
+    def top(self, heap):
+        """Return the smallest key in heap over the open states, or np.inf."""
+        while heap:
+            _, g, _, state = heap[0]
+            if state in self.open and self.g[state] == g:
+                return heap[0][0]
+            heapq.heappop(heap)
+        return np.inf
+
+    def pop(self):
+        """Close and return the open state of least priority."""
+        self.top(self.by_priority)
+        state = heapq.heappop(self.by_priority)[3]
+        self.open.remove(state)
+        return state
+
+
 def bidirectional_search(problem):
+    """[MM] Meet in the middle bidirectional search from problem.initial and
+    problem.goal. Returns the cost of a cheapest path, or np.inf if there is
+    none. Both directions use problem.h, computed once per state."""
     e = 0
     if isinstance(problem, GraphProblem):
         e = problem.find_min_edge()
-    gF, gB = {Node(problem.initial): 0}, {Node(problem.goal): 0}
-    openF, openB = [Node(problem.initial)], [Node(problem.goal)]
-    closedF, closedB = [], []
-    U = np.inf
-
-    def extend(U, open_dir, open_other, g_dir, g_other, closed_dir):
-        """Extend search in given direction"""
-        n = find_key(C, open_dir, g_dir)
-
-        open_dir.remove(n)
-        closed_dir.append(n)
-
-        for c in n.expand(problem):
-            if c in open_dir or c in closed_dir:
-                if g_dir[c] <= problem.path_cost(g_dir[n], n.state, None, c.state):
-                    continue
-
-                open_dir.remove(c)
-
-            g_dir[c] = problem.path_cost(g_dir[n], n.state, None, c.state)
-            open_dir.append(c)
-
-            if c in open_other:
-                U = min(U, g_dir[c] + g_other[c])
+    h_cache = {}
 
-        return U, open_dir, closed_dir, g_dir
+    def h(state):
+        try:
+            return h_cache[state]
+        except KeyError:
+            value = h_cache[state] = problem.h(Node(state))
+            return value
 
-    def find_min(open_dir, g):
-        """Finds minimum priority, g and f values in open_dir"""
-        # pr_min_f isn't forward pr_min instead it's the f-value
-        # of node with priority pr_min.
-        pr_min, pr_min_f = np.inf, np.inf
-        for n in open_dir:
-            f = g[n] + problem.h(n)
-            pr = max(f, 2 * g[n])
-            pr_min = min(pr_min, pr)
-            pr_min_f = min(pr_min_f, f)
-
-        return pr_min, pr_min_f, min(g.values())
-
-    def find_key(pr_min, open_dir, g):
-        """Finds key in open_dir with value equal to pr_min
-        and minimum g value."""
-        m = np.inf
-        node = Node(-1)
-        for n in open_dir:
-            pr = max(g[n] + problem.h(n), 2 * g[n])
-            if pr == pr_min:
-                if g[n] < m:
-                    m = g[n]
-                    node = n
-
-        return node
+    forward, backward = MMFrontier(problem.initial, h), MMFrontier(problem.goal, h)
+    U = np.inf
 
-    while openF and openB:
-        pr_min_f, f_min_f, g_min_f = find_min(openF, gF)
-        pr_min_b, f_min_b, g_min_b = find_min(openB, gB)
+    def extend(U, side, other):
+        """Extend search in given direction"""
+        n = side.pop()
+        g_n = side.g[n]
+        for action in problem.actions(n):
+            c = problem.result(n, action)
+            g_c = problem.path_cost(g_n, n, action, c)
+            if c in side.g and side.g[c] <= g_c:
+                continue
+            side.push(c, g_c)
+            if c in other.open:
+                U = min(U, g_c + other.g[c])
+        return U
+
+    while forward.open and backward.open:
+        pr_min_f, pr_min_b = forward.top(forward.by_priority), backward.top(backward.by_priority)
         C = min(pr_min_f, pr_min_b)
 
-        if U <= max(C, f_min_f, f_min_b, g_min_f + g_min_b + e):
+        if U <= max(C, forward.top(forward.by_f), backward.top(backward.by_f),
+                    forward.top(forward.by_g) + backward.top(backward.by_g) + e):
             return U
 
         if C == pr_min_f:
             # Extend forward
-            U, openF, closedF, gF = extend(U, openF, openB, gF, gB, closedF)
+            U = extend(U, forward, backward)
         else:
             # Extend backward
-            U, openB, closedB, gB = extend(U, openB, openF, gB, gF, closedB)
+            U = extend(U, backward, forward)
 
     return np.inf
 
@@ -427,12 +625,370 @@ greedy_best_first_graph_search = best_first_graph_search
 # Greedy best-first search is accomplished by specifying f(n) = h(n).
 
 
-def astar_search(problem, h=None, display=False):
+def astar_search(problem, h=None, display=False, listener=None, explored=None):
     """A* search is best-first graph search with f(n) = g(n)+h(n).
     You need to specify the h function when you call astar_search, or
     else in your Problem subclass."""
     h = memoize(h or problem.h, 'h')
-    return best_first_graph_search(problem, lambda n: n.path_cost + h(n), display)
+    return best_first_graph_search(problem, lambda n: n.path_cost + h(n), display, listener, explored)
+
+
+class TranspositionTable:
+    """The cheapest g each state was reached by, for up to max_size states.
+    Entries are filed under hash(state), which for the Zobrist states of the
+    vacuum problems is a stored 64-bit key, and states are only compared
+    in full when two of them share a hash."""
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self.table = {}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def get(self, state):
+        """Return the best g stored for state, or None."""
+        entry = self.table.get(hash(state))
+        while entry is not None:
+            if entry[0] == state:
+                return entry[1]
+            entry = entry[2]
+        return None
+
+    def improve(self, state, g):
+        """Return False if state is stored with a g no more than g. Otherwise
+        store g for it, if it is stored or there is room, and return True."""
+        key = hash(state)
+        head = entry = self.table.get(key)
+        while entry is not None:
+            if entry[0] == state:
+                if entry[1] <= g:
+                    return False
+                entry[1] = g
+                return True
+            entry = entry[2]
+        if self.max_size is None or self.size < self.max_size:
+            self.table[key] = [state, g, head]
+            self.size += 1
+        return True
+
+
+def ida_star_search(problem, h=None, transpositions=None):
+    """[Korf 1985] Iterative deepening A*: depth first searches cut off at
+    f = g + h > bound, with the bound raised each time to the smallest f
+    that was cut off, until a goal is found. Only the current path is kept,
+    and states already on it are skipped, so memory grows with the depth
+    of the solution instead of the size of the frontier. If transpositions
+    is given, up to that many states are also remembered in a
+    TranspositionTable with the cheapest g they were reached by in the
+    current iteration, and paths that reach one of them again no more
+    cheaply are cut off."""
+    h = memoize(h or problem.h, 'h')
+    root = Node(problem.initial)
+    if problem.goal_test(root.state):
+        return root
+    bound = h(root)
+    while bound < np.inf:
+        cutoff = np.inf
+        on_path = {root.state}
+        table = TranspositionTable(transpositions)
+        path = [(root, iter(root.expand(problem)))]
+        while path:
+            node, children = path[-1]
+            child = next(children, None)
+            if child is None:
+                path.pop()
+                on_path.discard(node.state)
+                continue
+            if child.state in on_path:
+                continue
+            f = child.path_cost + h(child)
+            if f > bound:
+                cutoff = min(cutoff, f)
+                continue
+            if transpositions is not None and not table.improve(child.state, child.path_cost):
+                continue
+            if problem.goal_test(child.state):
+                return child
+            on_path.add(child.state)
+            path.append((child, iter(child.expand(problem))))
+        bound = cutoff
+    return None
+
+
+def ara_star_solutions(problem, h=None, initial_weight=5, weight_step=.5, deadline=None):
+    """[Likhachev, Gordon and Thrun 2003] Anytime repairing A*. Searches with
+    f = g + weight * h, starting from initial_weight, and yields a
+    (goal node, bound) pair each time it has a better plan: its cost is at
+    most bound times the optimal one. Then it lowers the weight by
+    weight_step and carries on from the same search tree: the frontier is
+    re-sorted under the new weight, and only states whose g improved after
+    they were expanded are expanded again. Stops after the plan with
+    weight 1, which is optimal if h is admissible, or, once it has a plan,
+    at time.perf_counter() deadline."""
+    h_cache = {}
+
+    def h_value(node):
+        try:
+            return h_cache[node.state]
+        except KeyError:
+            value = h_cache[node.state] = (h or problem.h)(node)
+            return value
+
+    root = Node(problem.initial)
+    best = {root.state: root}  # the cheapest node found for every state
+    opened, closed, inconsistent = {root.state}, set(), set()
+    counter = itertools.count()
+    weight = initial_weight
+    heap = []
+    goal = root if problem.goal_test(root.state) else None
+
+    def push(state):
+        node = best[state]
+        heapq.heappush(heap, (node.path_cost + weight * h_value(node), next(counter), node))
+
+    def improve_path():
+        """Expand states until the goal is no worse than the frontier under
+        the current weight. Return False if stopped by the deadline."""
+        nonlocal goal
+        while heap:
+            f, _, node = heap[0]
+            if node.state not in opened or best[node.state] is not node:
+                heapq.heappop(heap)
+                continue
+            if goal is not None:
+                if goal.path_cost <= f:
+                    return True
+                if deadline is not None and time.perf_counter() > deadline:
+                    return False
+            heapq.heappop(heap)
+            opened.remove(node.state)
+            closed.add(node.state)
+            for child in node.expand(problem):
+                old = best.get(child.state)
+                if old is not None and old.path_cost <= child.path_cost:
+                    continue
+                best[child.state] = child
+                if problem.goal_test(child.state) and (goal is None or child.path_cost < goal.path_cost):
+                    goal = child
+                if child.state in closed:
+                    inconsistent.add(child.state)
+                else:
+                    opened.add(child.state)
+                    push(child.state)
+        return True
+
+    def lower_bound():
+        """The least g + h over the states that may still improve the plan."""
+        return min((best[state].path_cost + h_value(best[state]) for state in opened | inconsistent),
+                   default=goal.path_cost)
+
+    push(root.state)
+    bound = np.inf
+    while True:
+        finished = improve_path()
+        if goal is None:
+            return
+        lower = lower_bound()
+        new_bound = goal.path_cost / lower if lower > 0 else 1
+        if finished:
+            new_bound = min(new_bound, weight)
+        if new_bound < bound:
+            bound = new_bound
+            yield goal, bound
+        if not finished or weight <= 1:
+            return
+        weight = max(1, weight - weight_step)
+        opened |= inconsistent
+        inconsistent.clear()
+        closed.clear()
+        heap = []
+        for state in opened:
+            push(state)
+
+
+def ara_star_search(problem, h=None, time_budget=None, initial_weight=5, weight_step=.5, display=False):
+    """Run ara_star_solutions for at most time_budget seconds (or until the
+    plan is optimal) and return the last goal node it found, with its
+    suboptimality bound in node.bound, or None if there is no plan. The
+    first plan is returned even if it takes longer than time_budget. To plan
+    with it in a vacuum agent program, pass e.g.
+    searcher=functools.partial(ara_star_search, time_budget=1)."""
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    node = None
+    for node, bound in ara_star_solutions(problem, h, initial_weight, weight_step, deadline):
+        node.bound = bound
+        if display:
+            print(f'plan of cost {node.path_cost}, at most {bound:.3f} times optimal')
+    return node
+
+
+def node_bytes(node):
+    """Rough number of bytes a search Node takes up with its state and the
+    other values in its attributes (but not the nodes they refer to)."""
+    return sys.getsizeof(node) + sys.getsizeof(vars(node)) + sum(
+        sys.getsizeof(value) for value in vars(node).values() if not isinstance(value, Node))
+
+
+def sma_star_search(problem, h=None, max_nodes=None, max_bytes=None):
+    """[Russell 1992] Simplified memory-bounded A*. Works like A*, but holds
+    at most max_nodes nodes (or about max_bytes bytes of them, see
+    node_bytes), generating one successor at a time. When memory is full
+    the shallowest leaf of highest f is forgotten, and its parent keeps its
+    f so the subtree is regenerated if it turns out to be the best again.
+    A node whose successors are all generated backs up the least f below
+    it. Returns an optimal goal node if one is reachable with a path that
+    fits in memory, else None."""
+    h = memoize(h or problem.h, 'h')
+    root = Node(problem.initial)
+    if max_nodes is None and max_bytes is None:
+        raise ValueError('sma_star_search needs max_nodes or max_bytes')
+    counter = itertools.count()
+    lowest, highest = [], []
+    by_state = {}
+    used = 0
+
+    def add(node, f):
+        """Keep node in memory, with no successors generated yet."""
+        nonlocal used
+        node.f = f
+        node.children, node.pending, node.forgotten = [], None, {}
+        if by_state.get(node.state) is None or by_state[node.state].path_cost > node.path_cost:
+            by_state[node.state] = node
+        used += 1
+        reopen(node)
+
+    def reopen(node):
+        """(Re)insert node into the open heaps under its current f, first
+        clearing the stale entries out of them if they are most of it."""
+        nonlocal lowest, highest
+        if len(lowest) + len(highest) > 3 * used + 64:
+            lowest = [entry for entry in lowest if entry[3].version == entry[2]]
+            highest = [entry for entry in highest if entry[3].version == entry[2] and not entry[3].children]
+            heapq.heapify(lowest)
+            heapq.heapify(highest)
+        node.version = next(counter)
+        heapq.heappush(lowest, (node.f, -node.depth, node.version, node))
+        heapq.heappush(highest, (-node.f, node.depth, node.version, node))
+
+    def valid(heap):
+        """Pop stale entries off heap: the node was closed or re-keyed, or,
+        in highest, which only holds leaves, it has since had successors."""
+        while heap and (heap[0][3].version != heap[0][2] or heap is highest and heap[0][3].children):
+            heapq.heappop(heap)
+        return heap
+
+    def remove(node):
+        """Drop a leaf from memory, leaving its f with its parent."""
+        nonlocal used
+        node.version = None
+        used -= 1
+        if by_state.get(node.state) is node:
+            del by_state[node.state]
+        parent = node.parent
+        parent.children.remove(node)
+        parent.forgotten[node.action] = node.f
+        # Stale heap entries may still point at node until they are cleared
+        # out, so keep just what they check.
+        vars(node).clear()
+        node.version = node.children = None
+        if parent.version is None or not parent.children:
+            reopen(parent)
+
+    def forget(best):
+        """Forget the shallowest leaf of highest f other than best and root.
+        Return False if there is none."""
+        skipped, victim = [], None
+        while valid(highest):
+            entry = heapq.heappop(highest)
+            node = entry[3]
+            if node is best or node is root:
+                skipped.append(entry)
+            else:
+                victim = node
+                break
+        for entry in skipped:
+            heapq.heappush(highest, entry)
+        if victim is None:
+            return False
+        remove(victim)
+        return True
+
+    def successor(node):
+        """Generate the next successor of node that is worth keeping, or None."""
+        if node.pending:
+            action, floor = node.pending.pop(), 0
+        else:
+            action = min(node.forgotten, key=node.forgotten.get)
+            floor = node.forgotten.pop(action)
+        child = node.child_node(problem, action)
+        ancestor = node
+        while ancestor is not None:
+            if ancestor.state == child.state:
+                return None
+            ancestor = ancestor.parent
+        other = by_state.get(child.state)
+        if other is not None and other.path_cost <= child.path_cost:
+            return None
+        if child.depth >= max_nodes - 1 and not problem.goal_test(child.state):
+            return child, np.inf
+        return child, max(node.f, child.path_cost + h(child), floor)
+
+    def backup(node):
+        """Back up f through the ancestors of node whose successors have all
+        been generated."""
+        while node is not None and node.pending == []:
+            f = min(min((child.f for child in node.children), default=np.inf),
+                    min(node.forgotten.values(), default=np.inf))
+            if f == node.f:
+                return
+            node.f = f
+            if node.version is not None:
+                reopen(node)
+            node = node.parent
+
+    add(root, h(root))
+    if max_nodes is None:
+        # Besides itself, a node can account for three heap entries and one
+        # forgotten node they still point at, between clear outs.
+        forgotten = Node(None)
+        vars(forgotten).clear()
+        forgotten.version = forgotten.children = None
+        max_nodes = max_bytes // (node_bytes(root) + 3 * (sys.getsizeof(lowest[0]) + 8) + node_bytes(forgotten))
+    while valid(lowest):
+        best = lowest[0][3]
+        if best.f == np.inf:
+            return None
+        if problem.goal_test(best.state):
+            return best
+        if best.pending is None:
+            best.pending = list(reversed(problem.actions(best.state)))
+        if best.pending or best.forgotten:
+            generated = successor(best)
+            if generated is not None:
+                if used >= max_nodes and not forget(best):
+                    return None
+                child, f = generated
+                best.children.append(child)
+                add(child, f)
+        if best.pending or best.forgotten:
+            backup(best)
+            continue
+        best.version = None
+        node = best
+        while not node.children and not node.pending and not node.forgotten:
+            # A dead end: drop it, and its parent if that leaves it one too.
+            if node is root:
+                return None
+            parent, action = node.parent, node.action
+            remove(node)
+            del parent.forgotten[action]
+            if not parent.pending and not parent.forgotten:
+                parent.version = None
+            node = parent
+        backup(node)
+    return None
 
 
 # ______________________________________________________________________________
@@ -443,6 +999,8 @@ class EightPuzzle(Problem):
     squares is a blank. A state is represented as a tuple of length 9, where  element at
     index i represents the tile number  at index i (0 if it's an empty square) """
 
+    integer_costs = True
+
     def __init__(self, initial, goal=(1, 2, 3, 4, 5, 6, 7, 8, 0)):
         """ Define goal state and initialize a problem """
         super().__init__(initial, goal)
@@ -615,14 +1173,19 @@ class PlanRoute(Problem):
 # Other search algorithms
 
 
-def recursive_best_first_search(problem, h=None):
-    """[Figure 3.26]"""
+def recursive_best_first_search(problem, h=None, listener=None):
+    """[Figure 3.26] If listener is given, it is told of the search as it
+    goes, with the depth of the current path as the frontier size."""
     h = memoize(h or problem.h, 'h')
 
     def RBFS(problem, node, flimit):
         if problem.goal_test(node.state):
+            if listener:
+                listener.on_goal(node)
             return node, 0  # (The second value is immaterial)
         successors = node.expand(problem)
+        if listener:
+            listener.expanded(node, successors, range(node.depth))
         if len(successors) == 0:
             return None, np.inf
         for s in successors:
@@ -1091,18 +1654,21 @@ def RandomGraph(nodes=list(range(10)), min_links=2, width=400, height=300,
     # Build the cities
     for node in nodes:
         g.locations[node] = (random.randrange(width), random.randrange(height))
+    # The nearest neighbor search compares squared distances of all cities at
+    # once with numpy, so graphs of thousands of nodes build in seconds.
+    xy = np.array([g.locations[node] for node in nodes], dtype=np.int64).reshape(-1, 2)
+    index = {node: i for i, node in enumerate(nodes)}
     # Build roads from each city to at least min_links nearest neighbors.
     for i in range(min_links):
-        for node in nodes:
+        for j, node in enumerate(nodes):
             if len(g.get(node)) < min_links:
                 here = g.locations[node]
-
-                def distance_to_node(n):
-                    if n is node or g.get(node, n):
-                        return np.inf
-                    return distance(g.locations[n], here)
-
-                neighbor = min(nodes, key=distance_to_node)
+                squared = ((xy - xy[j]) ** 2).sum(axis=1).astype(float)
+                squared[j] = np.inf
+                for n, d in g.get(node).items():
+                    if d:
+                        squared[index[n]] = np.inf
+                neighbor = nodes[int(np.argmin(squared))]
                 d = distance(g.locations[neighbor], here) * curvature()
                 g.connect(node, neighbor, int(d))
     return g
@@ -1259,6 +1825,8 @@ class NQueensProblem(Problem):
     <Node (7, 3, 0, 2, 5, 1, 6, 4)>
     """
 
+    integer_costs = True
+
     def __init__(self, N):
         super().__init__(tuple([-1] * N))
         self.N = N
@@ -1558,6 +2126,10 @@ class InstrumentedProblem(Problem):
     def value(self, state):
         return self.problem.value(state)
 
+    @property
+    def integer_costs(self):
+        return getattr(self.problem, 'integer_costs', False)
+
     def __getattr__(self, attr):
         return getattr(self.problem, attr)
 
@@ -1589,3 +2161,270 @@ def compare_graph_searchers():
                                 GraphProblem('Q', 'WA', australia_map)],
                       header=['Searcher', 'romania_map(Arad, Bucharest)',
                               'romania_map(Oradea, Neamt)', 'australia_map'])
+
+
+# ______________________________________________________________________________
+# Search events
+
+
+class SearchListener:
+    """Subclass this and override the on_ methods to watch a search as it
+    runs; pass it as listener= to best_first_graph_search, astar_search,
+    uniform_cost_search, recursive_best_first_search or the tree and graph
+    searches. Every expanded node is passed to on_expand and each of its
+    children to on_generate; children dropped because their state was
+    explored or already on the frontier at no worse a cost go to
+    on_duplicate, and the goal node to on_goal. Every `every` expansions
+    on_sizes gets the sizes of the frontier and explored set. Without a
+    listener a search still pays a truth test for each expansion, for each
+    child it drops as a duplicate and for the goal it returns."""
+
+    every = 1000
+
+    def __init__(self):
+        self.expansions = 0
+
+    def expanded(self, node, children, frontier, explored=()):
+        """Called by the searches once node is expanded into children."""
+        self.on_expand(node)
+        for child in children:
+            self.on_generate(child)
+        self.expansions += 1
+        if self.expansions % self.every == 0:
+            self.on_sizes(len(frontier), len(explored))
+
+    def on_expand(self, node):
+        pass
+
+    def on_generate(self, node):
+        pass
+
+    def on_duplicate(self, node):
+        pass
+
+    def on_goal(self, node):
+        pass
+
+    def on_sizes(self, frontier, explored):
+        pass
+
+
+class SearchListeners(SearchListener):
+    """Pass the events of one search on to several listeners."""
+
+    def __init__(self, *listeners):
+        super().__init__()
+        self.listeners = listeners
+
+    def expanded(self, node, children, frontier, explored=()):
+        for listener in self.listeners:
+            listener.expanded(node, children, frontier, explored)
+
+    def on_duplicate(self, node):
+        for listener in self.listeners:
+            listener.on_duplicate(node)
+
+    def on_goal(self, node):
+        for listener in self.listeners:
+            listener.on_goal(node)
+
+
+class ExpansionRate(SearchListener):
+    """Count expansions, generated nodes and duplicates, and time them from
+    the first expansion to the goal (or to now, if the search is still
+    running or failed)."""
+
+    def __init__(self):
+        super().__init__()
+        self.generated = self.duplicates = 0
+        self.start = self.stop = None
+
+    def on_expand(self, node):
+        if self.start is None:
+            self.start = time.perf_counter()
+
+    def on_generate(self, node):
+        self.generated += 1
+
+    def on_duplicate(self, node):
+        self.duplicates += 1
+
+    def on_goal(self, node):
+        self.stop = time.perf_counter()
+
+    @property
+    def seconds(self):
+        if self.start is None:
+            return 0
+        return (self.stop or time.perf_counter()) - self.start
+
+    @property
+    def rate(self):
+        """Expansions per second."""
+        return self.expansions / self.seconds if self.seconds else 0
+
+    def __repr__(self):
+        return '<{} expanded in {:.3f}s, {:.0f}/s, {} generated, {} duplicates>'.format(
+            self.expansions, self.seconds, self.rate, self.generated, self.duplicates)
+
+
+class FrontierHistogram(SearchListener):
+    """Keep the frontier and explored set sizes seen every `every`
+    expansions, and summarize the frontier sizes in bins of bin_width."""
+
+    def __init__(self, every=100, bin_width=1000):
+        super().__init__()
+        self.every = every
+        self.bin_width = bin_width
+        self.sizes = []
+
+    def on_sizes(self, frontier, explored):
+        self.sizes.append((frontier, explored))
+
+    def histogram(self):
+        """Return (bin start, count) pairs of the frontier sizes."""
+        return histogram((frontier for frontier, _ in self.sizes),
+                         bin_function=lambda size: size - size % self.bin_width)
+
+    @property
+    def peak(self):
+        return max((frontier for frontier, _ in self.sizes), default=0)
+
+
+class ProfiledProblem(InstrumentedProblem):
+    """An InstrumentedProblem that also times every call of actions, result
+    and goal_test, and of any heuristic wrapped by timed (problem.h is
+    wrapped already), so we can see which of them a search spends its time
+    in. self.calls and self.seconds are dicts from those names."""
+
+    def __init__(self, problem):
+        super().__init__(problem)
+        self.calls = Counter()
+        self.seconds = Counter()
+        if hasattr(problem, 'h'):
+            self.h = self.timed(problem.h, 'h')
+
+    def timed(self, fn, label=None):
+        """Return fn, counting and timing its calls under label."""
+        label = label or name(fn)
+
+        def timed_fn(*args):
+            start = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self.seconds[label] += time.perf_counter() - start
+                self.calls[label] += 1
+
+        return timed_fn
+
+    def actions(self, state):
+        start = time.perf_counter()
+        result = super().actions(state)
+        self.seconds['actions'] += time.perf_counter() - start
+        self.calls['actions'] += 1
+        return result
+
+    def result(self, state, action):
+        start = time.perf_counter()
+        result = super().result(state, action)
+        self.seconds['result'] += time.perf_counter() - start
+        self.calls['result'] += 1
+        return result
+
+    def goal_test(self, state):
+        start = time.perf_counter()
+        result = super().goal_test(state)
+        self.seconds['goal_test'] += time.perf_counter() - start
+        self.calls['goal_test'] += 1
+        return result
+
+    def report(self):
+        """Print the calls and time of each method, the slowest first."""
+        table = [[label, self.calls[label], '{:.4f}'.format(seconds),
+                  '{:.2f}'.format(1e6 * seconds / self.calls[label])]
+                 for label, seconds in self.seconds.most_common()]
+        print_table(table, ['Method', 'Calls', 'Seconds', 'us/call'])
+
+
+# ______________________________________________________________________________
+# Portfolio search
+
+
+def portfolio_search(problem, searchers, timeout=None, display=False, poll=0.1):
+    """Race searchers on problem, each in a process of its own, and return
+    the goal node of the first one to find a solution, with the name of
+    that searcher in node.strategy. The others are stopped then. Returns
+    None if none of them finds a solution within timeout seconds.
+    searchers is a list of functions of the problem, named as by name(),
+    or a dict from names to them; heuristic variants are just more
+    functions, e.g.
+        portfolio_search(problem, {'astar': astar_search,
+                                   'ida*': functools.partial(ida_star_search, transpositions=10 ** 5)})
+    With the 'fork' start method (the default on Linux) searchers may be
+    lambdas and closures; otherwise they and the problem must pickle.
+    The queue of results is polled every poll seconds, and a worker that
+    died without sending one (killed for running out of memory, say) counts
+    as finished without a solution. A searcher that raised sends back its
+    exception; with display the failures are printed."""
+    if not isinstance(searchers, dict):
+        searchers = {name(searcher): searcher for searcher in searchers}
+    results = multiprocessing.Queue()
+    workers = {label: multiprocessing.Process(target=portfolio_worker, args=(label, searcher, problem, results),
+                                              daemon=True)
+               for label, searcher in searchers.items()}
+    start = time.perf_counter()
+    for worker in workers.values():
+        worker.start()
+    node = None
+    pending = dict(workers)
+    failures = {}
+    dead = set()  # workers found dead at the last poll, in case their result is still on its way
+    try:
+        while pending:
+            wait = poll if timeout is None else min(poll, start + timeout - time.perf_counter())
+            if wait <= 0:
+                break
+            try:
+                label, path, error = results.get(timeout=wait)
+            except queue.Empty:
+                for label, worker in list(pending.items()):
+                    if worker.exitcode is None:
+                        continue
+                    if label in dead:
+                        failures[label] = 'exited with code {} and no result'.format(worker.exitcode)
+                        del pending[label]
+                    else:
+                        dead.add(label)
+                continue
+            pending.pop(label, None)
+            if error is not None:
+                failures[label] = error
+            if path is not None:
+                for state, action, path_cost in path:
+                    node = Node(state, node, action, path_cost)
+                node.strategy = label
+                break
+    finally:
+        for worker in workers.values():
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+    if display:
+        for label, failure in failures.items():
+            print(f'{label} failed: {failure}')
+        print(f'{node.strategy if node else "no searcher"} won after {time.perf_counter() - start:.3f}s')
+    return node
+
+
+def portfolio_worker(label, searcher, problem, results):
+    """Run one searcher for portfolio_search and send back its label, the
+    (state, action, path_cost) steps of its solution or None, and the text
+    of the exception it raised or None. A path is sent rather than the goal
+    node so long plans don't nest too deep to pickle."""
+    error = None
+    try:
+        node = searcher(problem)
+    except Exception as e:
+        node, error = None, '{}: {}'.format(type(e).__name__, e)
+    results.put((label, node and [(n.state, n.action, n.path_cost) for n in node.path()], error))
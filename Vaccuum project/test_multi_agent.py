@@ -0,0 +1,60 @@
+import random
+import time
+
+import pytest
+
+from benchmark_fixtures import quiet
+from environments import Agent
+from grid_context import grid_topology
+from vacuum_grid import VacuumGrid
+from vacuum_toy_grid import ToyVacuumGrid
+from vacuum_planning_agent_program import VacuumPlanningAgentProgram
+from vacuum_toy_planning_program import ToyVacuumPlanningAgentProgram
+from vacuum_heuristics import CapacityToyHeuristic
+
+
+def toy_program():
+    return ToyVacuumPlanningAgentProgram(heuristic=CapacityToyHeuristic, macro=True)
+
+
+def dirt_program():
+    return VacuumPlanningAgentProgram(compact=True, tour=True)
+
+
+def run_agents(env, make_program, count, max_steps=3000):
+    """Add count agents to env and run it headless until it is done."""
+    for _ in range(count):
+        env.add_thing(Agent(make_program()))
+    env.headless_mode()
+    quiet(env.run_until_done, max_steps)
+    return env
+
+
+@pytest.mark.parametrize('count', [2, 3, 4])
+@pytest.mark.parametrize('seed', [0, 1, 2, 15])
+def test_toy_agents_finish(seed, count):
+    """Seed 2 has two agents meet head on, and in seed 15 with three agents
+    those with nothing left to do hem in the one still carrying a toy."""
+    random.seed(seed)
+    assert run_agents(ToyVacuumGrid(12, 12, .06, 3), toy_program, count).is_done()
+
+
+@pytest.mark.parametrize('count', [2, 4])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_dirt_agents_finish(seed, count):
+    random.seed(seed)
+    assert run_agents(VacuumGrid(12, 12), dirt_program, count).is_done()
+
+
+def test_agents_plan_on_one_grid():
+    """The other agents are not obstacles, so however they move, every plan
+    is made on the one grid and its cached topology. Two agents in the toy
+    world of benchmarks.benchmark_multi_agent take 0.8 s here; when every
+    move of one had the other plan on a new grid, they took 9.9 s."""
+    random.seed(0)
+    env = ToyVacuumGrid(30, 30, .01, 3)
+    grid_topology.cache_clear()
+    start = time.perf_counter()
+    assert run_agents(env, toy_program, 2).is_done()
+    assert time.perf_counter() - start < 5
+    assert grid_topology.cache_info().misses == 1
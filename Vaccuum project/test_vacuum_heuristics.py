@@ -0,0 +1,45 @@
+import math
+
+from benchmark_fixtures import quiet, toy_world_state, weighted
+from search import Node, astar_search
+from vacuum_heuristics import CapacityToyHeuristic
+from vacuum_toy_grid import ToyVacuumState
+from vacuum_toy_planning_program import CompactToyVacuumGridProblem, MacroToyVacuumGridProblem
+
+
+def walled_in_toy_state(toys):
+    """A 7x7 world whose toy at (5, 5) is walled in by obstacles."""
+    return ToyVacuumState(width=7, height=7, agent=(1, 1), obstacles=((4, 5), (5, 4)), toys=toys, box=(1, 5),
+                          agent_toys=0, max_toys=1)
+
+
+def test_capacity_heuristic_unreachable_toy():
+    problem = quiet(CompactToyVacuumGridProblem, walled_in_toy_state(((3, 1), (5, 5))))
+    h = CapacityToyHeuristic(problem)
+    assert h.trips(problem.cells(problem.initial)[1]) is None
+    assert h(Node(problem.initial)) == math.inf
+    assert astar_search(problem, h) is None
+
+
+def test_capacity_heuristic_reachable_toys():
+    problem = quiet(CompactToyVacuumGridProblem, walled_in_toy_state(((3, 1), (3, 3))))
+    h = CapacityToyHeuristic(problem)
+    node = astar_search(problem, h)
+    assert 0 < h(Node(problem.initial)) <= len(node.solution())
+
+
+def test_capacity_heuristic_20x20():
+    """With max_toys=10, 20x20 worlds are solved in seconds while they have
+    up to about 15 toys (about 5 s for 15), and by weighted A* on the macro
+    problem up to about 30 (0.4 s for 33 toys); at toy_chance=.2 they have
+    65 toys, which neither solves."""
+    state = toy_world_state(20, 20, .05, 10, seed=0)
+    problem = quiet(CompactToyVacuumGridProblem, state)
+    macro = MacroToyVacuumGridProblem(problem)
+    assert len(state.toys) == 15
+    assert len(macro.primitive_plan(astar_search(macro, CapacityToyHeuristic(macro))).solution()) == 121
+
+    state = toy_world_state(20, 20, .1, 10, seed=0)
+    macro = MacroToyVacuumGridProblem(quiet(CompactToyVacuumGridProblem, state))
+    assert len(state.toys) == 33
+    assert macro.primitive_plan(astar_search(macro, weighted(CapacityToyHeuristic(macro), 2)))
@@ -5,6 +5,8 @@ import collections
 import collections.abc
 import functools
 import heapq
+import itertools
+import math
 import os.path
 import random
 from itertools import chain, combinations
@@ -14,19 +16,29 @@ import numpy as np
 
 # part1. General data structures and their functions
 # ______________________________________________________________________________
-# Queues: Stack, FIFOQueue, PriorityQueue
+# Queues: Stack, FIFOQueue, PriorityQueue, BucketQueue
 # Stack and FIFOQueue are implemented as list and collection.deque
-# PriorityQueue is implemented here
+# PriorityQueue and BucketQueue are implemented here
 
 
 class PriorityQueue:
     """A Queue in which the minimum (or maximum) element (as determined by f and order) is returned first.
     If order is 'min', the item with minimum f(x) is
     returned first; if order is 'max', then it is the item with maximum f(x).
-    Also supports dict-like lookup."""
+    Also supports dict-like lookup.
+    Items are keyed by equality, so they must be hashable, and appending an
+    item equal to one already queued replaces it. Membership, lookup and
+    deletion are O(1); append and pop are O(log n). Deleted items are only
+    marked as removed and skipped when they reach the top of the heap. Ties
+    in f are broken by insertion order, so the items themselves are never
+    compared."""
+
+    REMOVED = object()  # placeholder for an item whose heap entry is stale
 
     def __init__(self, order='min', f=lambda x: x):
         self.heap = []
+        self.entries = {}  # item -> [f(item), insertion count, item]
+        self.counter = itertools.count()
 
         if order == 'min':
             self.f = f
@@ -37,7 +49,11 @@ class PriorityQueue:
 
     def append(self, item):
         """Insert item at its correct position."""
-        heapq.heappush(self.heap, (self.f(item), item))
+        if item in self.entries:
+            self.entries.pop(item)[-1] = self.REMOVED
+        entry = [self.f(item), next(self.counter), item]
+        self.entries[item] = entry
+        heapq.heappush(self.heap, entry)
 
     def extend(self, items):
         """Insert each item in items at its correct position."""
@@ -47,34 +63,127 @@ class PriorityQueue:
     def pop(self):
         """Pop and return the item (with min or max f(x) value)
         depending on the order."""
-        if self.heap:
-            return heapq.heappop(self.heap)[1]
-        else:
-            raise Exception('Trying to pop from empty PriorityQueue.')
+        while self.heap:
+            item = heapq.heappop(self.heap)[-1]
+            if item is not self.REMOVED:
+                del self.entries[item]
+                return item
+        raise Exception('Trying to pop from empty PriorityQueue.')
 
     def __len__(self):
         """Return current capacity of PriorityQueue."""
-        return len(self.heap)
+        return len(self.entries)
 
     def __contains__(self, key):
         """Return True if the key is in PriorityQueue."""
-        return any([item == key for _, item in self.heap])
+        return key in self.entries
 
     def __getitem__(self, key):
-        """Returns the first value associated with key in PriorityQueue.
+        """Returns the value associated with key in PriorityQueue.
         Raises KeyError if key is not present."""
-        for value, item in self.heap:
-            if item == key:
-                return value
-        raise KeyError(str(key) + " is not in the priority queue")
+        try:
+            return self.entries[key][0]
+        except KeyError:
+            raise KeyError(str(key) + " is not in the priority queue")
 
     def __delitem__(self, key):
-        """Delete the first occurrence of key."""
+        """Delete key by marking its heap entry as removed."""
         try:
-            del self.heap[[item == key for _, item in self.heap].index(True)]
-        except ValueError:
+            self.entries.pop(key)[-1] = self.REMOVED
+        except KeyError:
             raise KeyError(str(key) + " is not in the priority queue")
-        heapq.heapify(self.heap)
+        # Rebuild once stale entries make up most of the heap, so it never
+        # grows beyond a constant factor of the live items.
+        if len(self.heap) > 2 * len(self.entries) + 32:
+            self.heap = [entry for entry in self.heap if entry[-1] is not self.REMOVED]
+            heapq.heapify(self.heap)
+
+
+class BucketQueue:
+    """A min-priority queue with the interface of PriorityQueue('min', f)
+    for items whose f(x) is a non-negative int (or infinity, for items
+    that come out last), such as search nodes with integer step costs and
+    heuristic. Items are kept in an array of buckets
+    indexed by f, with a pointer to the lowest bucket that may be
+    non-empty, so append and pop take O(1) time instead of O(log n) and
+    never compare items. Within a bucket, items with the larger g(x) come
+    out first (for nodes, g is the path cost, which favours the nodes
+    nearest the goal), and among those the last appended. Deletion is lazy,
+    as in PriorityQueue."""
+
+    REMOVED = PriorityQueue.REMOVED
+
+    def __init__(self, f=lambda x: x, g=lambda x: 0):
+        self.f = f
+        self.g = g
+        self.buckets = []  # buckets[f] is a dict from g to a stack of entries
+        self.infinite = {}  # the bucket of the items with infinite f
+        self.entries = {}  # item -> [f(item), g(item), item]
+        self.min = 0  # no bucket below this one has a live entry
+
+    def append(self, item):
+        """Insert item into the bucket of f(item)."""
+        if item in self.entries:
+            self.entries.pop(item)[-1] = self.REMOVED
+        f, g = self.f(item), self.g(item)
+        entry = [f, g, item]
+        if f == math.inf:
+            bucket = self.infinite
+        elif f < 0 or f != int(f):
+            raise ValueError('BucketQueue needs non-negative integer priorities, not {}'.format(f))
+        else:
+            f = entry[0] = int(f)
+            while len(self.buckets) <= f:
+                self.buckets.append({})
+            bucket = self.buckets[f]
+            self.min = min(self.min, f)
+        self.entries[item] = entry
+        bucket.setdefault(g, []).append(entry)
+
+    def extend(self, items):
+        """Insert each item in items into its bucket."""
+        for item in items:
+            self.append(item)
+
+    def pop(self):
+        """Pop and return the item with the lowest f, and of those the highest g."""
+        while self.entries:
+            if self.min < len(self.buckets):
+                bucket = self.buckets[self.min]
+                if not bucket:
+                    self.min += 1
+                    continue
+            else:
+                bucket = self.infinite
+            g = max(bucket)
+            stack = bucket[g]
+            item = stack.pop()[-1]
+            if not stack:
+                del bucket[g]
+            if item is not self.REMOVED:
+                del self.entries[item]
+                return item
+        raise Exception('Trying to pop from empty BucketQueue.')
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __getitem__(self, key):
+        """Returns the f of key. Raises KeyError if key is not present."""
+        try:
+            return self.entries[key][0]
+        except KeyError:
+            raise KeyError(str(key) + " is not in the bucket queue")
+
+    def __delitem__(self, key):
+        """Delete key by marking its entry as removed."""
+        try:
+            self.entries.pop(key)[-1] = self.REMOVED
+        except KeyError:
+            raise KeyError(str(key) + " is not in the bucket queue")
 
 
 # ______________________________________________________________________________
@@ -1,9 +1,8 @@
 
-from environments import XYEnvironment, Wall, Obstacle, Dirt, Agent
+from environments import VacuumGridEnvironment, Wall, Obstacle, Dirt, Agent
+from grid_encoding import cell_index, cell_location, cells_to_mask, mask_to_cells, zobrist_keys
 import random
-from dataclasses import dataclass
-import os
-from time import sleep
+from dataclasses import dataclass, field
 
 
 @dataclass(frozen=True, order=True)
@@ -13,11 +12,12 @@ class VGState:
     agent: tuple[int, int]
     obstacles: tuple[tuple[int, int], ...]
     dirts: tuple[tuple[int, int], ...]
+    others: tuple[tuple[int, int], ...] = ()  # the other agents in the way
 
     def display(self):
         for y in range(self.height):
             for x in range(self.width):
-                if (x, y) == self.agent:
+                if (x, y) == self.agent or (x, y) in self.others:
                     print('V', end=" ")
                 elif (x, y) in self.obstacles:
                     print('C', end=" ")
@@ -32,7 +32,60 @@ class VGState:
             print()
 
 
-class VacuumGrid(XYEnvironment):
+@dataclass(frozen=True, order=True, slots=True)
+class VGSearchState:
+    """The part of a VGState that changes while searching. The rest of the
+    world is kept once per problem in a GridContext."""
+    agent: tuple[int, int]
+    dirts: tuple[tuple[int, int], ...]
+
+    @classmethod
+    def from_state(cls, state: VGState):
+        return cls(agent=state.agent, dirts=state.dirts)
+
+    def to_state(self, grid) -> VGState:
+        return VGState(width=grid.width, height=grid.height, agent=self.agent,
+                       obstacles=tuple(grid.obstacles), dirts=self.dirts)
+
+
+@dataclass(frozen=True, order=True, slots=True)
+class CompactVGState:
+    """A VGSearchState packed into ints (see grid_encoding): agent is a cell
+    index and dirts is a bitmask over cell indices."""
+    agent: int
+    dirts: int
+
+    @classmethod
+    def from_state(cls, state: VGState):
+        return cls(agent=cell_index(state.agent, state.width),
+                   dirts=cells_to_mask(state.dirts, state.width))
+
+    def to_state(self, grid) -> VGState:
+        return VGState(width=grid.width, height=grid.height,
+                       agent=cell_location(self.agent, grid.width),
+                       obstacles=tuple(grid.obstacles),
+                       dirts=mask_to_cells(self.dirts, grid.width))
+
+
+@dataclass(frozen=True, order=True, slots=True)
+class ZobristVGState(CompactVGState):
+    """A CompactVGState that carries its Zobrist hash (see grid_encoding) in
+    key. The problem updates key as it makes successors, so hashing one is
+    an attribute read; states are still compared field by field when
+    their keys match."""
+    key: int = field(default=0, compare=False, repr=False)
+
+    @classmethod
+    def from_state(cls, state: VGState):
+        keys = zobrist_keys(state.width * state.height)
+        agent, dirts = cell_index(state.agent, state.width), cells_to_mask(state.dirts, state.width)
+        return cls(agent=agent, dirts=dirts, key=keys.agent[agent] ^ keys.mask_key(dirts))
+
+    def __hash__(self):
+        return self.key
+
+
+class VacuumGrid(VacuumGridEnvironment):
     def __init__(self, width, height):
         super().__init__(width, height)
 
@@ -54,9 +107,10 @@ class VacuumGrid(XYEnvironment):
     def percept(self, agent):
         # the agent can see the entire environment. How does this work:
         return VGState(width=self.width, height=self.height,
-                       agent=self.agents[0].location,
-                       obstacles=tuple([o.location for o in self.things if isinstance(o, Obstacle)]),
-                       dirts=tuple([d.location for d in self.things if isinstance(d, Dirt)]))
+                       agent=agent.location,
+                       obstacles=self.locations_of(Obstacle),
+                       dirts=self.locations_of(Dirt),
+                       others=self.agents_in_way(agent))
 
     def execute_action(self, agent, action):
         if action == 'Suck':
@@ -65,26 +119,8 @@ class VacuumGrid(XYEnvironment):
                 dirt = dirt_list[0]
                 agent.performance += 1
                 self.delete_thing(dirt)
-        else:
-            new_loc = None
-            if action == 'Left':
-                new_loc = (agent.location[0]-1, agent.location[1])
-            elif action == 'Right':
-                new_loc = (agent.location[0]+1, agent.location[1])
-            elif action == 'Up':
-                new_loc = (agent.location[0], agent.location[1]-1)
-            elif action == 'Down':
-                new_loc = (agent.location[0], agent.location[1]+1)
-
-            if new_loc and (not self.some_things_at(new_loc, Obstacle)
-                            and not self.some_things_at(new_loc, Wall)):
-                agent.location = new_loc
+        elif action in self.moves:
+            self.move(agent, action)
 
     def is_done(self):
-        return len([d for d in self.things if isinstance(d, Dirt)]) == 0
-
-    def display(self, s, action):
-        sleep(0.5)
-        os.system('clear')
-        print(f'step {s}: action {action}')
-        self.agents[0].program.show_state()
+        return len(self.things_of(Dirt)) == 0
@@ -0,0 +1,272 @@
+"""
+Admissible heuristics for the vacuum planners.
+
+Distances here are true shortest-path distances on the static grid, found by
+breadth first search from a target cell (a dirt, a toy or the box) over the
+GridTopology, so they walk around obstacles. One DistanceFields object per
+grid caches a distance field for every cell it is asked about, and answers
+questions about a single pair of cells with Jump Point Search instead.
+
+The heuristics bound the cost of the remaining plan from below, so A* with
+them returns optimal plans: the agent has to walk from where it stands to
+some remaining target, and from there along a path through all the others,
+which is never shorter than a minimum spanning tree (MST) over them. The MST
+only depends on which targets remain, so it is cached per target bitmask.
+
+A heuristic is built from a problem, heuristic = MSTDirtHeuristic(problem),
+and called on nodes, so it can be passed straight to astar_search.
+"""
+
+import functools
+import math
+from collections import deque
+
+from grid_context import MOVES
+from grid_encoding import cell_index, mask_cells
+from jump_point import JumpPointSearch
+
+
+class DistanceFields:
+    """Breadth first distance fields on one GridTopology. fields[cell] is a
+    list giving the number of moves from every cell to cell (math.inf where
+    there is no path), computed the first time it is needed."""
+
+    def __init__(self, topology):
+        self.topology = topology
+        self.fields = {}
+        self.jump_points = JumpPointSearch(topology)
+        self.pairs = {}
+
+    @functools.cached_property
+    def regions(self):
+        """A list giving for every cell the number of the connected region of
+        free cells it is in (None for a blocked cell), so two cells can reach
+        each other exactly when their regions are equal."""
+        moves, free = self.topology.moves, self.topology.free
+        regions = [None] * self.topology.size
+        region = 0
+        for source in range(self.topology.size):
+            if not free[source] or regions[source] is not None:
+                continue
+            regions[source] = region
+            stack = [source]
+            while stack:
+                for _, neighbour in moves[stack.pop()]:
+                    if regions[neighbour] is None:
+                        regions[neighbour] = region
+                        stack.append(neighbour)
+            region += 1
+        return regions
+
+    def __getitem__(self, cell):
+        try:
+            return self.fields[cell]
+        except KeyError:
+            field = self.fields[cell] = self.bfs(cell)
+            return field
+
+    def bfs(self, source):
+        moves = self.topology.moves
+        field = [math.inf] * self.topology.size
+        field[source] = 0
+        frontier = deque([source])
+        while frontier:
+            cell = frontier.popleft()
+            d = field[cell] + 1
+            for _, neighbour in moves[cell]:
+                if field[neighbour] > d:
+                    field[neighbour] = d
+                    frontier.append(neighbour)
+        return field
+
+    def walk(self, start, goal):
+        """Return the moves of a shortest path from cell start to cell goal,
+        found with Jump Point Search (see path), or None if there is none."""
+        cells = self.path(start, goal)
+        if cells is None:
+            return None
+        step = self.topology.step
+        return [next(move for move in MOVES if step[move][a] == b) for a, b in zip(cells, cells[1:])]
+
+    def distance(self, a, b):
+        """Return the number of moves between cells a and b, from a distance
+        field if either has one, else from a shortest path between them."""
+        if b in self.fields:
+            return self.fields[b][a]
+        if a in self.fields:
+            return self.fields[a][b]
+        path = self.path(a, b)
+        return math.inf if path is None else len(path) - 1
+
+    def path(self, a, b):
+        """Return the cells of a shortest path from cell a to cell b, both
+        included, or None if there is none."""
+        key = (a, b) if a <= b else (b, a)
+        try:
+            path = self.pairs[key]
+        except KeyError:
+            path = self.pairs[key] = self.jump_points.path(*key)
+        if path is None or path[0] == a:
+            return path
+        return path[::-1]
+
+
+def distance_fields(grid):
+    """Return the DistanceFields of a GridContext, shared by every problem
+    and heuristic on a grid with the same layout."""
+    return topology_distance_fields(grid.topology)
+
+
+@functools.lru_cache(maxsize=16)
+def topology_distance_fields(topology):
+    return DistanceFields(topology)
+
+
+class TargetSets:
+    """Per set of target cells (a bitmask), the distance fields of the
+    targets and the weight of a minimum spanning tree over them, each
+    computed once and cached."""
+
+    def __init__(self, fields):
+        self.distance_fields = fields
+        self.field_cache = {}
+        self.tree_cache = {}
+
+    def fields(self, mask):
+        """Return the distance fields of the cells in mask."""
+        try:
+            return self.field_cache[mask]
+        except KeyError:
+            fields = self.field_cache[mask] = [self.distance_fields[cell] for cell in mask_cells(mask)]
+            return fields
+
+    def tree(self, mask):
+        """Return the weight of a minimum spanning tree over the cells in mask."""
+        try:
+            return self.tree_cache[mask]
+        except KeyError:
+            tree = self.tree_cache[mask] = self.mst(mask_cells(mask), self.fields(mask))
+            return tree
+
+    @staticmethod
+    def mst(cells, fields):
+        """Weight of a minimum spanning tree over cells, by Prim's algorithm.
+        fields[i] is the distance field of cells[i]."""
+        if not cells:
+            return 0
+        best = [fields[0][cell] for cell in cells]
+        in_tree = [False] * len(cells)
+        in_tree[0] = True
+        total = 0
+        for _ in range(len(cells) - 1):
+            i = min((j for j in range(len(cells)) if not in_tree[j]), key=best.__getitem__)
+            in_tree[i] = True
+            total += best[i]
+            field = fields[i]
+            for j, cell in enumerate(cells):
+                if not in_tree[j] and field[cell] < best[j]:
+                    best[j] = field[cell]
+        return total
+
+
+class MSTDirtHeuristic:
+    """Admissible h for VacuumGridProblem and CompactVacuumGridProblem:
+    moves to the nearest dirt, plus an MST over all the dirt, plus one Suck
+    per dirt."""
+
+    def __init__(self, problem):
+        self.problem = problem
+        self.targets = TargetSets(distance_fields(problem.grid))
+
+    def __call__(self, node):
+        agent, dirts = self.problem.cells(node.state)
+        if not dirts:
+            return 0
+        nearest = min(field[agent] for field in self.targets.fields(dirts))
+        return nearest + self.targets.tree(dirts) + dirts.bit_count()
+
+
+class MSTToyHeuristic:
+    """Admissible h for ToyVacuumGridProblem and CompactToyVacuumGridProblem:
+    moves to the nearest toy, plus an MST over the toys and the box, plus one
+    PickUp per toy and a final Drop. Once the floor is clear it is the
+    distance to the box plus the Drop."""
+
+    def __init__(self, problem):
+        self.problem = problem
+        self.fields = distance_fields(problem.grid)
+        self.box = cell_index(problem.grid.box, problem.grid.width)
+        self.targets = TargetSets(self.fields)
+
+    def __call__(self, node):
+        agent, toys = self.problem.cells(node.state)
+        if not toys:
+            if node.state.agent_toys == 0:
+                return 0
+            return self.fields[self.box][agent] + 1
+        nearest = min(field[agent] for field in self.targets.fields(toys))
+        return nearest + self.targets.tree(toys | 1 << self.box) + toys.bit_count() + 1
+
+
+class CapacityToyHeuristic(MSTToyHeuristic):
+    """Admissible h for the toy problems that also counts the trips to the
+    box that max_toys forces. With r toys on the floor and c carried, at
+    least D = ceil((r + c) / max_toys) Drops are needed, and:
+      - before the first Drop the agent walks to the box, by way of a toy
+        unless it is already full;
+      - the toys that don't fit in that first load go to the box in round
+        trips of at most max_toys toys. A round trip is at least twice as
+        long as the distance from the box to its farthest toy, so at least
+        2 / max_toys times the summed box distances of its toys.
+    The result is the larger of that bound and the MST bound, or math.inf if
+    a remaining toy can't reach the box. The parts that only depend on which
+    toys remain are cached by toy bitmask.
+
+    It solves 20x20 worlds with max_toys=10 in seconds while they have up to
+    about 15 toys, and a MacroToyVacuumGridProblem with the bound weighted by
+    2 does so up to about 30; toy_chance=.2 puts 65 toys in them, which
+    neither solves."""
+
+    def __init__(self, problem):
+        super().__init__(problem)
+        self.capacity = problem.grid.max_toys
+        self.trip_cache = {}
+
+    def trips(self, toys):
+        """Return the toys' distances to the box, and the sums of all but the
+        k largest of them for every k up to max_toys; or None if one of the
+        toys can't reach the box."""
+        try:
+            return self.trip_cache[toys]
+        except KeyError:
+            box_field = self.fields[self.box]
+            to_box = [box_field[cell] for cell in mask_cells(toys)]
+            if math.inf in to_box:
+                self.trip_cache[toys] = None
+                return None
+            rest = sorted(to_box)
+            sums = [sum(rest)]
+            for k in range(min(self.capacity, len(rest))):
+                sums.append(sums[-1] - rest[-1 - k])
+            entry = self.trip_cache[toys] = to_box, sums
+            return entry
+
+    def __call__(self, node):
+        bound = super().__call__(node)
+        agent, toys = self.problem.cells(node.state)
+        if not toys:
+            return bound
+        trips = self.trips(toys)
+        if trips is None:
+            return math.inf
+        to_box, sums = trips
+        carried = node.state.agent_toys
+        remaining = toys.bit_count()
+        drops = -(-(remaining + carried) // self.capacity)
+        first_load = self.capacity - carried
+        if first_load:
+            first_leg = min(field[agent] + d for field, d in zip(self.targets.fields(toys), to_box))
+        else:
+            first_leg = self.fields[self.box][agent]
+        round_trips = -(-2 * sums[min(first_load, len(sums) - 1)] // self.capacity)
+        return max(bound, first_leg + round_trips + remaining + drops)
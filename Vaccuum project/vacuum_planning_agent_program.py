@@ -1,87 +1,270 @@
-from search import Problem, SimpleProblemSolvingAgentProgram, astar_search
-from vacuum_grid import VGState
+import math
+import time
+
+from search import Problem, Node, astar_search
+from vacuum_grid import VGState, VGSearchState, CompactVGState, ZobristVGState
+from grid_context import GridContext, SUCK
+from grid_encoding import cell_index, cells_to_mask, zobrist_keys
+from vacuum_heuristics import distance_fields, mask_cells
+from grid_planning_program import GridPlanningAgentProgram
 
 
 class VacuumGridProblem(Problem):
+    """Clean every dirt. The problem is built from a VGState percept but
+    searches over state_class records; the static part of the percept is
+    shared by all of them through self.grid. Actions are the ints from
+    grid_context; ACTION_NAMES turns a plan back into environment actions."""
+
+    state_class = VGSearchState
+    integer_costs = True
+    occupied = 0  # the bitmask of the cells other agents stand on; see block
+
     def __init__(self, initial: VGState, goal=None):
-        super().__init__(initial, goal)
+        self.grid = GridContext.from_state(initial)
+        super().__init__(self.state_class.from_state(initial), goal)
         self.width = initial.width
         self.height = initial.height
+        self.topology = self.grid.topology
+        # the actions available on each cell: Suck, then the legal moves
+        self.cell_actions = [(SUCK,) + legal for legal in self.topology.legal]
         print('initial problem state')
         initial.display()
 
-    def actions(self, state: VGState):
-        cur_loc = state.agent
-        acts = ['Suck']
-        left = (cur_loc[0]-1, cur_loc[1])
-        right = (cur_loc[0]+1, cur_loc[1])
-        up = (cur_loc[0], cur_loc[1]-1)
-        down = (cur_loc[0], cur_loc[1]+1)
-        if left not in state.obstacles and self.is_inbounds(left):
-            acts.append('Left')
-        if right not in state.obstacles and self.is_inbounds(right):
-            acts.append('Right')
-        if up not in state.obstacles and self.is_inbounds(up):
-            acts.append('Up')
-        if down not in state.obstacles and self.is_inbounds(down):
-            acts.append('Down')
-
-        return acts
-
-    def result(self, state: VGState, action: str):
+    def block(self, occupied):
+        """Leave the moves onto the cells of bitmask occupied, where other
+        agents stand, out of the actions until the next call. Only the
+        cell_actions around the cells that changed are rebuilt, so the
+        search itself pays nothing for it."""
+        for cell in self.topology.around(occupied ^ self.occupied):
+            self.cell_actions[cell] = (SUCK,) + self.topology.legal_avoiding(cell, occupied)
+        self.occupied = occupied
+
+    def actions(self, state: VGSearchState):
+        return self.cell_actions[cell_index(state.agent, self.width)]
+
+    def result(self, state: VGSearchState, action: int):
         """Return the state that results from executing the given
         action in the given state. The action must be one of
         self.actions(state)."""
 
         loc = state.agent
 
-        if action == 'Suck' and state.agent in state.dirts:
-            dirts = list(state.dirts)
-            dirts.remove(state.agent)
-            return VGState(width=state.width, height=state.height, agent=loc,
-                           obstacles=state.obstacles, dirts=tuple(dirts))
-
-        new_loc = None
-        if action == 'Left':
-            new_loc = (loc[0]-1, loc[1])
-        elif action == 'Right':
-            new_loc = (loc[0]+1, loc[1])
-        elif action == 'Up':
-            new_loc = (loc[0], loc[1]-1)
-        elif action == 'Down':
-            new_loc = (loc[0], loc[1]+1)
-        else:
-            new_loc = (loc[0], loc[1])
-
-        if not self.is_inbounds(new_loc) or new_loc in state.obstacles:
-            new_loc = loc
+        if action == SUCK:
+            if loc in state.dirts:
+                dirts = list(state.dirts)
+                dirts.remove(loc)
+                return VGSearchState(agent=loc, dirts=tuple(dirts))
+            return state
 
-        return VGState(width=state.width, height=state.height, agent=new_loc,
-                       obstacles=state.obstacles, dirts=state.dirts)
+        new_loc = self.topology.locations[self.topology.step[action][cell_index(loc, self.width)]]
+        return VGSearchState(agent=new_loc, dirts=state.dirts)
 
     def goal_test(self, state):
         return len(state.dirts) == 0
 
+    def cells(self, state):
+        """Return the agent's cell index and the bitmask of the cells with dirt."""
+        return cell_index(state.agent, self.width), cells_to_mask(state.dirts, self.width)
+
     def is_inbounds(self, loc: tuple[int, int]) -> bool:
         """Check if loc is inside the walls"""
-        x, y = loc
-        return 0 < x < self.height - 1 and 0 < y < self.width - 1
+        return self.grid.is_inbounds(loc)
 
+    def display_state(self, state):
+        state.to_state(self.grid).display()
 
-class VacuumPlanningAgentProgram(SimpleProblemSolvingAgentProgram):
-    def __init__(self):
-        super().__init__()
 
-    def update_state(self, percept: VGState):
-        # Replace our stored state with the new one. We are assuming that the percept
-        # is a full description of the environment
-        self.state = percept
+class CompactVacuumGridProblem(VacuumGridProblem):
+    """VacuumGridProblem over CompactVGState. A move is a lookup in the
+    topology's step table and Suck clears one bit of the dirt mask."""
+
+    state_class = CompactVGState
+
+    def actions(self, state: CompactVGState):
+        return self.cell_actions[state.agent]
+
+    def result(self, state: CompactVGState, action: int):
+        if action == SUCK:
+            return CompactVGState(agent=state.agent, dirts=state.dirts & ~(1 << state.agent))
+        return CompactVGState(agent=self.topology.step[action][state.agent], dirts=state.dirts)
+
+    def goal_test(self, state):
+        return state.dirts == 0
+
+    def cells(self, state):
+        return state.agent, state.dirts
+
+
+class ZobristVacuumGridProblem(CompactVacuumGridProblem):
+    """CompactVacuumGridProblem over ZobristVGState: each successor gets its
+    hash from its parent's with an XOR per changed feature."""
+
+    state_class = ZobristVGState
+
+    def __init__(self, initial: VGState, goal=None):
+        super().__init__(initial, goal)
+        self.keys = zobrist_keys(self.width * self.height)
+
+    def result(self, state: ZobristVGState, action: int):
+        agent = state.agent
+        if action == SUCK:
+            if state.dirts >> agent & 1:
+                return ZobristVGState(agent, state.dirts & ~(1 << agent), state.key ^ self.keys.item[agent])
+            return state
+        new = self.topology.step[action][agent]
+        return ZobristVGState(new, state.dirts, state.key ^ self.keys.agent[agent] ^ self.keys.agent[new])
+
+
+class DirtTourPlanner:
+    """A fast planner for the dirt problems that gives up optimality: it
+    picks the order to clean the dirts in as a short tour through them and
+    walks shortest paths between them. The distances between the agent and
+    the dirts come from the dirts' distance fields (see vacuum_heuristics).
+    The tour starts as nearest neighbour and is improved by 2-opt, which
+    reverses a stretch of it, and Or-opt, which moves a stretch of up to
+    three dirts elsewhere, either way round, until no move shortens it or
+    time_limit seconds have passed. time_limit=0 keeps the nearest neighbour
+    tour and None improves it to a local optimum."""
+
+    def __init__(self, problem: VacuumGridProblem, time_limit=1):
+        self.problem = problem
+        self.time_limit = time_limit
+        self.fields = distance_fields(problem.grid)
+
+    def plan(self):
+        """Return the node of the problem that cleans the dirts in tour order.
+        Dirts the agent can't reach are left, so then it is not a goal node."""
+        agent, dirts = self.problem.cells(self.problem.initial)
+        reachable = self.fields[agent]
+        stops = [agent] + [cell for cell in mask_cells(dirts) if reachable[cell] < math.inf]
+        dist = [[field[cell] for cell in stops] for field in map(self.fields.__getitem__, stops)]
+        tour = self.nearest_neighbour(dist)
+        self.improve(tour, dist)
+        return self.follow([stops[i] for i in tour])
+
+    @staticmethod
+    def nearest_neighbour(dist):
+        """Return a tour of the stops of the distance matrix dist, as indices
+        starting with the agent's, 0, that always goes to the closest stop
+        not yet visited."""
+        tour, left = [0], set(range(1, len(dist)))
+        while left:
+            row = dist[tour[-1]]
+            stop = min(left, key=row.__getitem__)
+            left.remove(stop)
+            tour.append(stop)
+        return tour
+
+    def improve(self, tour, dist):
+        """Shorten tour in place with 2-opt and Or-opt passes."""
+        if self.time_limit == 0:
+            return
+        deadline = math.inf if self.time_limit is None else time.perf_counter() + self.time_limit
+        while time.perf_counter() < deadline:
+            improved = self.two_opt(tour, dist, deadline)
+            improved = self.or_opt(tour, dist, deadline) or improved
+            if not improved:
+                return
+
+    @staticmethod
+    def two_opt(tour, dist, deadline):
+        """Reverse every stretch tour[i:j + 1] whose reversal shortens the
+        tour, which ends anywhere, and return whether any was."""
+        n, improved = len(tour), False
+        for i in range(1, n - 1):
+            if time.perf_counter() > deadline:
+                break
+            a = tour[i - 1]
+            row = dist[a]
+            for j in range(i + 1, n):
+                b, c = tour[i], tour[j]
+                if j + 1 < n:
+                    d = tour[j + 1]
+                    delta = row[c] + dist[b][d] - row[b] - dist[c][d]
+                else:
+                    delta = row[c] - row[b]
+                if delta < 0:
+                    tour[i:j + 1] = tour[j:i - 1:-1]
+                    improved = True
+        return improved
+
+    @staticmethod
+    def or_opt(tour, dist, deadline):
+        """Move every stretch of one to three stops to the place, either way
+        round, where it shortens the tour most, and return whether any was
+        moved."""
+        n, improved = len(tour), False
+        for size in (1, 2, 3):
+            for i in range(1, n - size + 1):
+                if time.perf_counter() > deadline:
+                    return improved
+                first, last, before = tour[i], tour[i + size - 1], tour[i - 1]
+                saved = dist[before][first]
+                if i + size < n:
+                    after = tour[i + size]
+                    saved += dist[last][after] - dist[before][after]
+                rest = tour[:i] + tour[i + size:]
+                best, where = 0, None
+                for k, p in enumerate(rest):
+                    q = rest[k + 1] if k + 1 < len(rest) else None
+                    for start, end in ((first, last), (last, first)):
+                        added = dist[p][start] + (dist[end][q] - dist[p][q] if q is not None else 0)
+                        if added - saved < best:
+                            best, where = added - saved, (k, start != first)
+                if where:
+                    k, backwards = where
+                    stretch = tour[i:i + size]
+                    tour[:] = rest[:k + 1] + (stretch[::-1] if backwards else stretch) + rest[k + 1:]
+                    improved = True
+        return improved
+
+    def follow(self, cells):
+        """Return the goal node of walking from cells[0] to each of the other
+        cells in turn and sucking there."""
+        problem = self.problem
+        node = Node(problem.initial)
+        for at, cell in zip(cells, cells[1:]):
+            for action in self.fields.walk(at, cell) + [SUCK]:
+                node = node.child_node(problem, action)
+        return node
+
+
+class VacuumPlanningAgentProgram(GridPlanningAgentProgram):
+    def __init__(self, compact=False, heuristic=None, searcher=astar_search, zobrist=False, tour=False,
+                 tour_time_limit=1):
+        """If compact, plan over CompactVGState instead of VGSearchState, and
+        if zobrist, over ZobristVGState.
+        If tour, plan with a DirtTourPlanner instead of searching: plans come
+        fast but are not always the shortest. tour_time_limit is its time
+        limit in seconds for improving the tour, trading plan length for
+        time (0 for none, None for no limit).
+        heuristic, if given, is called with the problem and returns the h
+        function for astar_search, e.g. vacuum_heuristics.MSTDirtHeuristic.
+        searcher is called as searcher(problem, h) and returns a goal node;
+        search.ida_star_search or a partial of search.sma_star_search with
+        max_bytes plan within a fixed amount of memory."""
+        super().__init__()
+        self.compact = compact or zobrist
+        self.zobrist = zobrist
+        self.heuristic = heuristic
+        self.searcher = searcher
+        self.tour = tour
+        self.tour_time_limit = tour_time_limit
 
     def formulate_problem(self):
+        if self.zobrist:
+            return ZobristVacuumGridProblem(self.state)
+        if self.compact:
+            return CompactVacuumGridProblem(self.state)
         return VacuumGridProblem(self.state)
 
     def search(self, problem):
-        return astar_search(problem, lambda n: 10*len(n.state.dirts)).solution()
-
-    def show_state(self):
-        self.state.display()
+        if self.tour:
+            return DirtTourPlanner(problem, self.tour_time_limit).plan()
+        if self.heuristic:
+            node = self.searcher(problem, self.heuristic(problem))
+        elif self.compact:
+            node = self.searcher(problem, lambda n: 10*n.state.dirts.bit_count())
+        else:
+            node = self.searcher(problem, lambda n: 10*len(n.state.dirts))
+        return node
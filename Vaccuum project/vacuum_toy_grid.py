@@ -1,9 +1,8 @@
 
-from environments import XYEnvironment, Wall, Obstacle, Toy, Agent, Box
+from environments import VacuumGridEnvironment, Wall, Obstacle, Toy, Agent, Box
+from grid_encoding import cell_index, cell_location, cells_to_mask, mask_to_cells, zobrist_keys
 import random
-from dataclasses import dataclass
-import os
-from time import sleep
+from dataclasses import dataclass, field
 
 
 @dataclass(frozen=True, order=True)
@@ -16,11 +15,12 @@ class ToyVacuumState:
     box: tuple[int, int]
     agent_toys: int
     max_toys: int
+    others: tuple[tuple[int, int], ...] = ()  # the other agents in the way
 
     def display(self):
         for y in range(self.height):
             for x in range(self.width):
-                if (x, y) == self.agent:
+                if (x, y) == self.agent or (x, y) in self.others:
                     print('V', end=" ")
                 elif (x, y) in self.obstacles:
                     print('#', end=" ")
@@ -38,12 +38,88 @@ class ToyVacuumState:
         print('toys in inv: ' + str(self.agent_toys))
 
 
-class ToyVacuumGrid(XYEnvironment):
+@dataclass(frozen=True, order=True, slots=True)
+class ToySearchState:
+    """The part of a ToyVacuumState that changes while searching. The rest
+    of the world is kept once per problem in a GridContext."""
+    agent: tuple[int, int]
+    toys: tuple[tuple[int, int], ...]
+    agent_toys: int
+
+    @classmethod
+    def from_state(cls, state: ToyVacuumState):
+        return cls(agent=state.agent, toys=state.toys, agent_toys=state.agent_toys)
+
+    def to_state(self, grid) -> ToyVacuumState:
+        return ToyVacuumState(width=grid.width, height=grid.height, agent=self.agent,
+                              obstacles=tuple(grid.obstacles), toys=self.toys, box=grid.box,
+                              agent_toys=self.agent_toys, max_toys=grid.max_toys)
+
+
+@dataclass(frozen=True, order=True, slots=True)
+class CompactToyVacuumState:
+    """A ToySearchState packed into ints (see grid_encoding): agent is a cell
+    index and toys is a bitmask over cell indices."""
+    agent: int
+    toys: int
+    agent_toys: int
+
+    @classmethod
+    def from_state(cls, state: ToyVacuumState):
+        return cls(agent=cell_index(state.agent, state.width),
+                   toys=cells_to_mask(state.toys, state.width),
+                   agent_toys=state.agent_toys)
+
+    def to_state(self, grid) -> ToyVacuumState:
+        return ToyVacuumState(width=grid.width, height=grid.height,
+                              agent=cell_location(self.agent, grid.width),
+                              obstacles=tuple(grid.obstacles),
+                              toys=mask_to_cells(self.toys, grid.width),
+                              box=grid.box, agent_toys=self.agent_toys, max_toys=grid.max_toys)
+
+
+@dataclass(frozen=True, order=True, slots=True)
+class ZobristToyVacuumState(CompactToyVacuumState):
+    """A CompactToyVacuumState that carries its Zobrist hash (see
+    grid_encoding) in key, updated by the problem as it makes successors."""
+    key: int = field(default=0, compare=False, repr=False)
+
+    @classmethod
+    def from_state(cls, state: ToyVacuumState):
+        keys = zobrist_keys(state.width * state.height)
+        agent, toys = cell_index(state.agent, state.width), cells_to_mask(state.toys, state.width)
+        return cls(agent=agent, toys=toys, agent_toys=state.agent_toys,
+                   key=keys.agent[agent] ^ keys.mask_key(toys) ^ keys.carried[state.agent_toys])
+
+    def __hash__(self):
+        return self.key
+
+
+@dataclass(frozen=True, order=True, slots=True)
+class LoadToyVacuumState(CompactToyVacuumState):
+    """A CompactToyVacuumState compared by agent, toys and load instead of
+    agent_toys. load is agent_toys, except that it is -1 while there are
+    toys left and they all fit in what the agent can still carry: from
+    then on the agent only picks them up and drops them all at the box, so
+    states that differ in nothing but agent_toys have the same plans left
+    and the search only keeps the cheapest of them."""
+    agent_toys: int = field(compare=False)
+    load: int = 0
+
+    @classmethod
+    def from_state(cls, state: ToyVacuumState):
+        toys = cells_to_mask(state.toys, state.width)
+        return cls(agent=cell_index(state.agent, state.width), toys=toys, agent_toys=state.agent_toys,
+                   load=-1 if toys and state.agent_toys + toys.bit_count() <= state.max_toys else state.agent_toys)
+
+
+class ToyVacuumGrid(VacuumGridEnvironment):
+    shared = (Box,)  # they all need to reach the box
 
     def __init__(self, width, height, toy_chance, max_toys=None):
         super().__init__(width, height)
 
-        self.agent_toys = 0
+        self.carried = {}  # agent -> the number of toys it carries
 
 
         # walls around the exterior
@@ -66,7 +142,7 @@ class ToyVacuumGrid(XYEnvironment):
             self.add_thing(Toy(), (random.randrange(1, width - 1), random.randrange(1, height - 1)), empty_only=True)
 
         if max_toys is None:
-            self.max_toys = sum(1 for d in self.things if isinstance(d, Toy))
+            self.max_toys = len(self.things_of(Toy))
         else:
             self.max_toys = max_toys
 
@@ -76,12 +152,13 @@ class ToyVacuumGrid(XYEnvironment):
     def percept(self, agent):
         # the agent can see the entire environment. How does this work:
         return ToyVacuumState(width=self.width, height=self.height,
-                       agent=self.agents[0].location,
-                       obstacles=tuple([o.location for o in self.things if isinstance(o, Obstacle)]),
-                       toys=tuple([d.location for d in self.things if isinstance(d, Toy)]),
-                       box=[b.location for b in self.things if isinstance(b, Box)][0],
-                       agent_toys=self.agent_toys,
-                       max_toys=self.max_toys)
+                       agent=agent.location,
+                       obstacles=self.locations_of(Obstacle),
+                       toys=self.locations_of(Toy),
+                       box=self.locations_of(Box)[0],
+                       agent_toys=self.carried.get(agent, 0),
+                       max_toys=self.max_toys,
+                       others=self.agents_in_way(agent))
 
     def execute_action(self, agent, action):
         if action == 'PickUp':
@@ -92,35 +169,17 @@ class ToyVacuumGrid(XYEnvironment):
                 toy = toy_list[0]
                 # remove the toy from the environment
                 self.delete_thing(toy)
-                self.agent_toys += 1
+                self.carried[agent] = self.carried.get(agent, 0) + 1
         if action == 'Drop':
             # gets any items at the current square (like another toy)
             cur_square = self.list_things_at(agent.location)
 
             # if we have toys in our inventory
-            if cur_square and isinstance(cur_square[0], Box) and self.agent_toys > 0:
+            if cur_square and isinstance(cur_square[0], Box) and self.carried.get(agent, 0) > 0:
                 agent.performance += 100
-                self.agent_toys = 0
-        else:
-            new_loc = None
-            if action == 'Left':
-                new_loc = (agent.location[0]-1, agent.location[1])
-            elif action == 'Right':
-                new_loc = (agent.location[0]+1, agent.location[1])
-            elif action == 'Up':
-                new_loc = (agent.location[0], agent.location[1]-1)
-            elif action == 'Down':
-                new_loc = (agent.location[0], agent.location[1]+1)
-
-            if new_loc and (not self.some_things_at(new_loc, Obstacle)
-                            and not self.some_things_at(new_loc, Wall)):
-                agent.location = new_loc
+                self.carried[agent] = 0
+        elif action in self.moves:
+            self.move(agent, action)
 
     def is_done(self):
-        return len([d for d in self.things if isinstance(d, Toy)]) == 0 and self.agent_toys == 0
-
-    def display(self, s, action):
-        sleep(0.5)
-        os.system('clear')
-        print(f'step {s}: action {action}')
-        self.agents[0].program.show_state()
+        return len(self.things_of(Toy)) == 0 and not any(self.carried.values())
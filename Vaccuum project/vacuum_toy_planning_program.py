@@ -1,107 +1,322 @@
-from search import Problem, SimpleProblemSolvingAgentProgram, astar_search
-from vacuum_toy_grid import ToyVacuumState
+import dataclasses
+import math
+
+from search import Problem, Node, astar_search
+from vacuum_toy_grid import (ToyVacuumState, ToySearchState, CompactToyVacuumState, ZobristToyVacuumState,
+                             LoadToyVacuumState)
+from grid_context import GridContext, PICK_UP, DROP
+from grid_encoding import cell_index, cell_location, cells_to_mask, zobrist_keys
+from vacuum_heuristics import distance_fields, mask_cells
+from grid_planning_program import GridPlanningAgentProgram
 
 
 class ToyVacuumGridProblem(Problem):
+    """Put every toy in the box. The problem is built from a ToyVacuumState
+    percept but searches over state_class records; the static part of the
+    percept (obstacles, box, max_toys) is shared by all of them through
+    self.grid. Actions are the ints from grid_context; ACTION_NAMES turns a
+    plan back into environment actions."""
+
+    state_class = ToySearchState
+    integer_costs = True
+    occupied = 0  # the bitmask of the cells other agents stand on; see block
+
     def __init__(self, initial: ToyVacuumState, goal=None):
-        super().__init__(initial, goal)
+        self.grid = GridContext.from_state(initial)
+        super().__init__(self.state_class.from_state(initial), goal)
         self.width = initial.width
         self.height = initial.height
+        self.topology = self.grid.topology
+        self.legal = list(self.topology.legal)
+        self.box = cell_index(self.grid.box, self.width)
         print('initial problem state')
         initial.display()
 
-    def actions(self, state: ToyVacuumState):
+    def actions(self, state: ToySearchState):
         cur_loc = state.agent
+        cell = cell_index(cur_loc, self.width)
+        can_pick_up = cur_loc in state.toys and state.agent_toys < self.grid.max_toys
+        can_drop = cell == self.box and (state.agent_toys == self.grid.max_toys or len(state.toys) == 0)
+        return self.cell_actions(cell, can_pick_up, can_drop)
+
+    def block(self, occupied):
+        """Like VacuumGridProblem.block: leave the moves onto the cells of
+        bitmask occupied out of the actions until the next call, updating
+        self.legal only around the cells that changed."""
+        for cell in self.topology.around(occupied ^ self.occupied):
+            self.legal[cell] = self.topology.legal_avoiding(cell, occupied)
+        self.occupied = occupied
+
+    def cell_actions(self, cell, can_pick_up, can_drop):
+        """The actions on cell: PickUp and Drop if they are allowed, then the legal moves."""
+        legal = self.legal[cell]
+        if not (can_pick_up or can_drop):
+            return legal
         acts = []
-        left = (cur_loc[0] - 1, cur_loc[1])
-        right = (cur_loc[0] + 1, cur_loc[1])
-        up = (cur_loc[0], cur_loc[1] - 1)
-        down = (cur_loc[0], cur_loc[1] + 1)
-
-        if cur_loc in state.toys and state.agent_toys < state.max_toys:
-            acts.append('PickUp')
-        if cur_loc == state.box and (state.agent_toys == state.max_toys or len(state.toys) == 0):
-            acts.append('Drop')
-        if left not in state.obstacles and self.is_inbounds(left):
-            acts.append('Left')
-        if right not in state.obstacles and self.is_inbounds(right):
-            acts.append('Right')
-        if up not in state.obstacles and self.is_inbounds(up):
-            acts.append('Up')
-        if down not in state.obstacles and self.is_inbounds(down):
-            acts.append('Down')
+        if can_pick_up:
+            acts.append(PICK_UP)
+        if can_drop:
+            acts.append(DROP)
+        acts.extend(legal)
         return acts
 
-    def result(self, state: ToyVacuumState, action: str):
+    def result(self, state: ToySearchState, action: int):
         """Return the state that results from executing the given
         action in the given state. The action must be one of
         self.actions(state)."""
 
         loc = state.agent
 
-        if action == 'PickUp':
+        if action == PICK_UP:
             toys = list(state.toys)
             toys.remove(state.agent)
-            return ToyVacuumState(width=state.width, height=state.height, agent=loc,
-                                  obstacles=state.obstacles, toys=tuple(toys),
-                                  box=state.box, agent_toys=state.agent_toys + 1,
-                                  max_toys=state.max_toys)
-        if action == 'Drop':
-            return ToyVacuumState(width=state.width, height=state.height, agent=loc,
-                                  obstacles=state.obstacles, toys=state.toys, box=state.box,
-                                  agent_toys=0, max_toys=state.max_toys)
-        new_loc = None
-        if action == 'Left':
-            new_loc = (loc[0] - 1, loc[1])
-        elif action == 'Right':
-            new_loc = (loc[0] + 1, loc[1])
-        elif action == 'Up':
-            new_loc = (loc[0], loc[1] - 1)
-        elif action == 'Down':
-            new_loc = (loc[0], loc[1] + 1)
-        else:
-            new_loc = (loc[0], loc[1])
-
-        if not self.is_inbounds(new_loc) or new_loc in state.obstacles:
-            new_loc = loc
+            return ToySearchState(agent=loc, toys=tuple(toys), agent_toys=state.agent_toys + 1)
+        if action == DROP:
+            return ToySearchState(agent=loc, toys=state.toys, agent_toys=0)
 
-        return ToyVacuumState(width=state.width, height=state.height, agent=new_loc,
-                              obstacles=state.obstacles, toys=state.toys, box=state.box, agent_toys=state.agent_toys,
-                              max_toys=state.max_toys)
+        new_loc = self.topology.locations[self.topology.step[action][cell_index(loc, self.width)]]
+        return ToySearchState(agent=new_loc, toys=state.toys, agent_toys=state.agent_toys)
 
     def goal_test(self, state):
         return len(state.toys) == 0 and state.agent_toys == 0
 
+    def cells(self, state):
+        """Return the agent's cell index and the bitmask of the cells with toys."""
+        return cell_index(state.agent, self.width), cells_to_mask(state.toys, self.width)
+
     def is_inbounds(self, loc: tuple[int, int]) -> bool:
         """Check if loc is inside the walls"""
-        x, y = loc
-        return 0 < x < self.height - 1 and 0 < y < self.width - 1
+        return self.grid.is_inbounds(loc)
+
+    def display_state(self, state):
+        state.to_state(self.grid).display()
+
+
+class CompactToyVacuumGridProblem(ToyVacuumGridProblem):
+    """ToyVacuumGridProblem over CompactToyVacuumState. A move is a lookup in
+    the topology's step table and PickUp clears one bit of the toy mask."""
+
+    state_class = CompactToyVacuumState
+
+    def actions(self, state: CompactToyVacuumState):
+        can_pick_up = state.toys >> state.agent & 1 and state.agent_toys < self.grid.max_toys
+        can_drop = state.agent == self.box and (state.agent_toys == self.grid.max_toys or state.toys == 0)
+        return self.cell_actions(state.agent, can_pick_up, can_drop)
+
+    def result(self, state: CompactToyVacuumState, action: int):
+        if action == PICK_UP:
+            return CompactToyVacuumState(agent=state.agent, toys=state.toys & ~(1 << state.agent),
+                                         agent_toys=state.agent_toys + 1)
+        if action == DROP:
+            return CompactToyVacuumState(agent=state.agent, toys=state.toys, agent_toys=0)
+        return CompactToyVacuumState(agent=self.topology.step[action][state.agent], toys=state.toys,
+                                     agent_toys=state.agent_toys)
+
+    def goal_test(self, state):
+        return state.toys == 0 and state.agent_toys == 0
+
+    def cells(self, state):
+        return state.agent, state.toys
+
+
+class ZobristToyVacuumGridProblem(CompactToyVacuumGridProblem):
+    """CompactToyVacuumGridProblem over ZobristToyVacuumState: each successor
+    gets its hash from its parent's with an XOR per changed feature."""
+
+    state_class = ZobristToyVacuumState
+
+    def __init__(self, initial: ToyVacuumState, goal=None):
+        super().__init__(initial, goal)
+        self.keys = zobrist_keys(self.width * self.height)
 
+    def result(self, state: ZobristToyVacuumState, action: int):
+        agent, carried, keys = state.agent, state.agent_toys, self.keys
+        if action == PICK_UP:
+            key = state.key ^ keys.item[agent] ^ keys.carried[carried] ^ keys.carried[carried + 1]
+            return ZobristToyVacuumState(agent, state.toys & ~(1 << agent), carried + 1, key)
+        if action == DROP:
+            return ZobristToyVacuumState(agent, state.toys, 0, state.key ^ keys.carried[carried] ^ keys.carried[0])
+        new = self.topology.step[action][agent]
+        return ZobristToyVacuumState(new, state.toys, carried, state.key ^ keys.agent[agent] ^ keys.agent[new])
 
-def get_heuristic(state):
-    if (state.agent_toys == state.max_toys) or len(state.toys) == 0:
-        return 5 * (abs(state.agent[0] - state.box[0]) +
-                abs(state.agent[1] - state.box[1]))
+
+class PrunedToyVacuumGridProblem(CompactToyVacuumGridProblem):
+    """CompactToyVacuumGridProblem that cuts the branching factor without
+    losing optimal plans:
+      - at the box, allowed to Drop and carrying toys, Drop is the only
+        action: nothing can be picked up until then, so any move first
+        would be wasted;
+      - once every toy left fits in what the agent can still carry, the
+        agent only has to collect them and drop once at the end, so it
+        always picks up a toy it stands on, and states that only differ
+        in how many toys it carries are the same state (LoadToyVacuumState).
+    Before that point, carrying fewer toys is not always better, since the
+    agent may only drop when full, so no other states are merged."""
+
+    state_class = LoadToyVacuumState
+
+    def actions(self, state: LoadToyVacuumState):
+        on_toy = state.toys >> state.agent & 1
+        if state.agent == self.box and state.agent_toys and (state.agent_toys == self.grid.max_toys or not state.toys):
+            return (DROP,)
+        if on_toy and state.load < 0:
+            return (PICK_UP,)
+        return self.cell_actions(state.agent, on_toy and state.agent_toys < self.grid.max_toys, False)
+
+    def result(self, state: LoadToyVacuumState, action: int):
+        if action == PICK_UP:
+            toys, agent_toys = state.toys & ~(1 << state.agent), state.agent_toys + 1
+        elif action == DROP:
+            toys, agent_toys = state.toys, 0
+        else:
+            return LoadToyVacuumState(self.topology.step[action][state.agent], state.toys, state.agent_toys,
+                                      state.load)
+        load = -1 if toys and agent_toys + toys.bit_count() <= self.grid.max_toys else agent_toys
+        return LoadToyVacuumState(state.agent, toys, agent_toys, load)
+
+
+class MacroToyVacuumGridProblem(Problem):
+    """The toy problem of a CompactToyVacuumGridProblem, searched over macro
+    actions instead of single steps: (PICK_UP, cell) walks a shortest path
+    to the toy on cell and picks it up, and (DROP, box) walks to the box and
+    drops, which is allowed when the primitive Drop would be. A macro costs
+    the length of its walk plus one, from the distance fields of the grid,
+    so the plan depth is the number of pickups and drops, and an optimal
+    macro plan is an optimal plan of the primitive problem. States are the
+    primitive problem's CompactToyVacuumStates, and the heuristics of
+    vacuum_heuristics work on this problem as well.
+    primitive_plan turns a macro goal node back into a primitive one."""
+
+    integer_costs = True
+
+    def __init__(self, problem: CompactToyVacuumGridProblem):
+        super().__init__(problem.initial)
+        self.primitive = problem
+        self.grid = problem.grid
+        self.topology = problem.topology
+        self.box = problem.box
+        self.fields = distance_fields(problem.grid)
+
+    def actions(self, state: CompactToyVacuumState):
+        agent, carried, max_toys = state.agent, state.agent_toys, self.grid.max_toys
+        acts = []
+        if carried and (carried == max_toys or not state.toys) and self.fields[self.box][agent] < math.inf:
+            acts.append((DROP, self.box))
+        if carried < max_toys:
+            acts.extend((PICK_UP, toy) for toy in mask_cells(state.toys) if self.fields[toy][agent] < math.inf)
+        return acts
+
+    def result(self, state: CompactToyVacuumState, action):
+        kind, cell = action
+        if kind == PICK_UP:
+            return CompactToyVacuumState(agent=cell, toys=state.toys & ~(1 << cell), agent_toys=state.agent_toys + 1)
+        return CompactToyVacuumState(agent=cell, toys=state.toys, agent_toys=0)
+
+    def path_cost(self, c, state1, action, state2):
+        return c + self.fields[action[1]][state1.agent] + 1
+
+    def goal_test(self, state):
+        return self.primitive.goal_test(state)
+
+    def cells(self, state):
+        return self.primitive.cells(state)
+
+    def primitive_plan(self, node):
+        """Return the goal node of the primitive problem that carries out the
+        macros of the goal node node, or None if node is None."""
+        if node is None:
+            return None
+        problem = self.primitive
+        primitive = Node(problem.initial)
+        for macro in node.solution():
+            for action in self.fields.walk(primitive.state.agent, macro[1]) + [macro[0]]:
+                primitive = primitive.child_node(problem, action)
+        return primitive
+
+
+def get_heuristic(state, grid):
+    if (state.agent_toys == grid.max_toys) or len(state.toys) == 0:
+        return 5 * (abs(state.agent[0] - grid.box[0]) +
+                abs(state.agent[1] - grid.box[1]))
     return 10 * len(state.toys)
 
 
-class ToyVacuumPlanningAgentProgram(SimpleProblemSolvingAgentProgram):
-    def __init__(self):
+def get_compact_heuristic(state, grid):
+    """get_heuristic for a CompactToyVacuumState."""
+    if (state.agent_toys == grid.max_toys) or state.toys == 0:
+        agent_x, agent_y = cell_location(state.agent, grid.width)
+        return 5 * (abs(agent_x - grid.box[0]) + abs(agent_y - grid.box[1]))
+    return 10 * state.toys.bit_count()
+
+
+class ToyVacuumPlanningAgentProgram(GridPlanningAgentProgram):
+    def __init__(self, compact=False, heuristic=None, searcher=astar_search, zobrist=False, prune=False,
+                 macro=False):
+        """If compact, plan over CompactToyVacuumState instead of ToySearchState,
+        if zobrist, over ZobristToyVacuumState, if prune, with
+        PrunedToyVacuumGridProblem, and if macro, with the macro actions of
+        MacroToyVacuumGridProblem (at most one of the last three).
+        heuristic, if given, is called with the problem and returns the h
+        function for astar_search, e.g. vacuum_heuristics.MSTToyHeuristic.
+        searcher is called as searcher(problem, h) and returns a goal node;
+        search.ida_star_search or a partial of search.sma_star_search with
+        max_bytes plan within a fixed amount of memory."""
         super().__init__()
+        if zobrist + prune + macro > 1:
+            raise ValueError('only one of zobrist, prune and macro can be used')
+        self.compact = compact or zobrist or prune or macro
+        self.zobrist = zobrist
+        self.prune = prune
+        self.macro = macro
+        self.heuristic = heuristic
+        self.searcher = searcher
+        self.seen = None  # the obstacles, toys and agent's region reachable_toys last worked from
+        self.regions = self.reachable = None
 
     def update_state(self, percept: ToyVacuumState):
-        # Replace our stored state with the new one. We are assuming that the percept
-        # is a full description of the environment
-        self.state = percept
+        # toys the agent can't reach are left out of its state
+        super().update_state(self.reachable_toys(percept))
+
+    def reachable_toys(self, percept: ToyVacuumState):
+        """Return percept without the toys the agent has no path to. The
+        regions of the grid are only looked up again when the obstacles
+        change, and the toys only sorted again when they or the agent's
+        region do, so a percept usually costs a few comparisons."""
+        obstacles, toys = percept.obstacles, percept.toys
+        if self.seen is None or obstacles != self.seen[0]:
+            self.regions = distance_fields(GridContext.from_state(percept)).regions
+            self.seen = (obstacles, None, None)
+        width = percept.width
+        region = self.regions[cell_index(percept.agent, width)]
+        if toys != self.seen[1] or region != self.seen[2]:
+            self.reachable = tuple(toy for toy in toys if self.regions[cell_index(toy, width)] == region)
+            self.seen = (obstacles, toys, region)
+        return percept if len(self.reachable) == len(toys) else dataclasses.replace(percept, toys=self.reachable)
 
     def formulate_problem(self):
+        if self.prune:
+            return PrunedToyVacuumGridProblem(self.state)
+        if self.zobrist:
+            return ZobristToyVacuumGridProblem(self.state)
+        if self.compact:
+            return CompactToyVacuumGridProblem(self.state)
         return ToyVacuumGridProblem(self.state)
 
     def search(self, problem):
-        return astar_search(problem, lambda n: get_heuristic(n.state)).solution()
+        if self.macro:
+            macro = MacroToyVacuumGridProblem(problem)
+            return macro.primitive_plan(self.solve(macro))
+        return self.solve(problem)
 
-    def show_state(self):
-        self.state.display()
+    def solve(self, problem):
+        """Run the searcher on problem with the heuristic chosen."""
+        if self.heuristic:
+            node = self.searcher(problem, self.heuristic(problem))
+        elif self.compact:
+            node = self.searcher(problem, lambda n: get_compact_heuristic(n.state, problem.grid))
+        else:
+            node = self.searcher(problem, lambda n: get_heuristic(n.state, problem.grid))
+        return node
 
 
 '''